@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+MAX_LINES_PER_LOT = 20
+
+
+class DigestEntry(NamedTuple):
+    lot_id: str
+    lot_name: str
+    lot_number: str
+    bet_value: float
+    telegram_id: int
+    username: str
+    phone: str
+    at: datetime
+
+
+def format_single(entry: DigestEntry) -> str:
+    return (
+        "🎉 Новая ставка!\n\n"
+        f"Лот: {entry.lot_name}\n"
+        f"Номер лота: {entry.lot_number}\n"
+        f"Ставка: {entry.bet_value:.0f} ₽\n"
+        f"TG ID: {entry.telegram_id}\n"
+        f"Username: @{entry.username}\n"
+        f"Телефон: {entry.phone}"
+    )
+
+
+def format_lot_digest(entries: list, window: float) -> str:
+    first, leader = entries[0], max(entries, key=lambda e: e.bet_value)
+    lines = [
+        f"{e.at:%H:%M:%S} — {e.bet_value:.0f} ₽ — @{e.username} ({e.phone}, {e.telegram_id})"
+        for e in entries[-MAX_LINES_PER_LOT:]
+    ]
+    if len(entries) > MAX_LINES_PER_LOT:
+        lines.insert(0, f"… и ещё {len(entries) - MAX_LINES_PER_LOT}")
+    return (
+        f"📊 Ставок за {window:g} с: {len(entries)}\n\n"
+        f"Лот: {first.lot_name}\n"
+        f"Номер лота: {first.lot_number}\n"
+        f"Лидер: {leader.bet_value:.0f} ₽ — @{leader.username}, {leader.phone}\n\n"
+        + "\n".join(lines)
+    )
+
+
+class AdminDigest:
+    """Сводка ставок для администратора.
+
+    При window > 0 ставки копятся и раз в окно уходят одним сообщением на
+    лот; при window == 0 каждая ставка отправляется сразу, как раньше.
+    """
+
+    def __init__(self, send, window: float = 0.0):
+        # send(text) ставит сообщение администратору в очередь отправки
+        self._send = send
+        self.window = window
+        self._entries = {}
+        self._flush_task = None
+
+    def add(self, entry: DigestEntry):
+        if self.window <= 0:
+            self._send(format_single(entry))
+            return
+        self._entries.setdefault(entry.lot_id, []).append(entry)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    def set_window(self, window: float):
+        if window <= 0:
+            self.flush()
+        self.window = window
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self.flush()
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._flush_task = None
+        self.flush()
+
+    def flush(self):
+        entries, self._entries = self._entries, {}
+        for lot_entries in entries.values():
+            self._send(format_lot_digest(lot_entries, self.window))
+        if entries:
+            logger.info(f"Отправлена сводка ставок по {len(entries)} лотам")
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from baserow_client import BaserowRejected, get_client
+from models import Bet, Lot
+
+logger = logging.getLogger(__name__)
+
+MONTHS_RU = [
+    'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+    'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря'
+]
+
+
+def format_date_ru(value: datetime) -> str:
+    return f"{value.day} {MONTHS_RU[value.month - 1]} {value.year} года"
+
+
+def parse_end_date(value, tz) -> datetime:
+    # Дата без времени означает окончание торгов в конце этого дня
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if len(value) <= 10:
+        parsed = datetime.combine(parsed.date(), time(23, 59, 59))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed
+
+
+def parse_bet_time(value, tz) -> datetime:
+    # Date ставки; время без пояса бот записывает по локальному времени сервера
+    if not value or len(value) <= 10:
+        return None
+    try:
+        return datetime.fromisoformat(value).astimezone(tz)
+    except ValueError:
+        return None
+
+
+class AuctionCloseEngine:
+    """Закрытие торгов по расписанию.
+
+    Время окончания лота берётся из end_date его аукциона. В это время
+    лоты замораживаются в книге ставок, победители всех закрываемых лотов
+    определяются одним проходом по таблице Bets, а сообщения победителям
+    и остальным участникам уходят через очередь уведомлений. Закрытый лот
+    помечается в Baserow (status = false, FinalPrice), поэтому после
+    перезапуска повторных рассылок не будет. Лот считается закрытым только
+    после этой отметки: при ошибке Baserow он остаётся замороженным, а
+    закрытие повторяется через retry_interval секунд. Окончательный отказ
+    Baserow (например, лот удалён) не повторяется: лот размораживается, а
+    администратор получает одно сообщение.
+    """
+
+    def __init__(self, order_book, user_resolver, send, pending_bets, tz: str = 'Europe/Moscow',
+                 soft_close_window: float = 0, soft_close_extension: float = 300,
+                 retry_interval: float = 60):
+        # send(chat_id, text) ставит сообщение в очередь,
+        # pending_bets() -> [(lot_id, user_id, value)] ещё не дошедшие до Baserow ставки
+        self._order_book = order_book
+        self._user_resolver = user_resolver
+        self._send = send
+        self._pending_bets = pending_bets
+        self.tz = ZoneInfo(tz)
+        # Антиснайпинг: ставка за soft_close_window секунд до конца продлевает торги
+        self.soft_close_window = soft_close_window
+        self.soft_close_extension = soft_close_extension
+        self._end_times = {}
+        # Продления антиснайпинга есть только у бота (в снимке), в Baserow их нет
+        self._extended = {}
+        self._names = {}
+        self.retry_interval = retry_interval
+        self._closed = set()
+        # Лоты, которые закрываются прямо сейчас
+        self._closing = set()
+        self._scheduled = set()
+        self._job_queue = None
+
+    def end_time(self, lot_id) -> datetime:
+        return self._end_times.get(str(lot_id))
+
+    def is_closed(self, lot_id) -> bool:
+        # Замороженный лот, итоги которого ещё не записаны, тоже не принимает ставок
+        return str(lot_id) in self._closed or self._order_book.is_frozen(lot_id)
+
+    def results_text(self, lot_id) -> str:
+        end = self.end_time(lot_id)
+        if end is None:
+            return "Итоги аукциона будут объявлены после завершения торгов."
+        return f"Итоги аукциона будут объявлены {format_date_ru(end.astimezone(self.tz))}."
+
+    def export(self) -> dict:
+        return {
+            'end_times': {lot_id: end.isoformat() for lot_id, end in self._end_times.items()},
+            'extended': {lot_id: end.isoformat() for lot_id, end in self._extended.items()},
+            'names': self._names,
+            'closed': sorted(self._closed),
+        }
+
+    async def restore(self, data: dict):
+        for lot_id, end in data.get('end_times', {}).items():
+            self._end_times[lot_id] = datetime.fromisoformat(end)
+        for lot_id, end in data.get('extended', {}).items():
+            self._extended[lot_id] = datetime.fromisoformat(end)
+        self._names.update(data.get('names', {}))
+        for lot_id in data.get('closed', []):
+            self._closed.add(lot_id)
+            await self._order_book.freeze(lot_id)
+
+    async def load(self):
+        auctions = {}
+        async for auction in get_client().iter_rows(os.getenv('BASEROW_AUCTIONS_ID')):
+            if (end := parse_end_date(auction.get('end_date'), self.tz)) is not None:
+                auctions[auction['id']] = end
+        async for lot in get_client().iter_rows(os.getenv('BASEROW_LOTS_ID'), model=Lot):
+            lot_id = str(lot.id)
+            self._names[lot_id] = lot.name or 'Лот'
+            if not lot.active:
+                self._closed.add(lot_id)
+                await self._order_book.freeze(lot_id)
+                continue
+            if lot.auction_id in auctions:
+                # Сверка с Baserow не отменяет продление: берётся более позднее время
+                end = auctions[lot.auction_id]
+                if (extended := self._extended.get(lot_id)) is not None and extended > end:
+                    end = extended
+                self._end_times[lot_id] = end
+        logger.info(f"Расписание закрытия: {len(self._end_times)} лотов, закрыто ранее: {len(self._closed)}")
+
+    def schedule(self, job_queue):
+        self._job_queue = job_queue
+        groups = defaultdict(list)
+        for lot_id, end in self._end_times.items():
+            # Повторный вызов после сверки с Baserow добавляет только новые задания
+            if lot_id not in self._closed and (lot_id, end) not in self._scheduled:
+                self._scheduled.add((lot_id, end))
+                groups[end].append(lot_id)
+        now = datetime.now(self.tz)
+        for end, lot_ids in groups.items():
+            # Пропущенное время закрытия (бот был остановлен) обрабатывается сразу
+            job_queue.run_once(self._run_job, when=max(end, now), data=lot_ids, name=f"close_{end.isoformat()}")
+
+    def extend(self, lot_id, new_end: datetime):
+        lot_id = str(lot_id)
+        self._end_times[lot_id] = new_end
+        self._extended[lot_id] = new_end
+        if self._job_queue is not None:
+            self._scheduled.add((lot_id, new_end))
+            self._job_queue.run_once(self._run_job, when=new_end, data=[lot_id], name=f"close_{lot_id}_{new_end.isoformat()}")
+
+    def soft_close(self, lot_id, placed_at: str = None) -> datetime:
+        """Продлевает торги по лоту, если ставка сделана в последние минуты; возвращает новое время окончания."""
+        end = self.end_time(lot_id)
+        if self.soft_close_window <= 0 or end is None or self.is_closed(lot_id):
+            return None
+        # Окно отсчитывается от времени ставки (поле Date), а не от момента, когда
+        # бот её прочитал: ставка с сайта может прийти с опозданием
+        at = parse_bet_time(placed_at, self.tz) or datetime.now(self.tz)
+        if end <= at or end - at > timedelta(seconds=self.soft_close_window):
+            return None
+        new_end = at + timedelta(seconds=self.soft_close_extension)
+        if new_end <= end:
+            return None
+        self.extend(lot_id, new_end)
+        logger.info(f"Торги по лоту {lot_id} продлены до {new_end.isoformat()}")
+        return new_end
+
+    async def _run_job(self, context):
+        now = datetime.now(self.tz)
+        # Лоты, время которых продлили, закроются своим отдельным заданием
+        due = [
+            lot_id for lot_id in context.job.data
+            if lot_id not in self._closed and self._end_times.get(lot_id, now) <= now
+        ]
+        if due:
+            await self.close_lots(due)
+
+    async def _run_retry(self, context):
+        await self.close_lots(context.job.data)
+
+    def _retry(self, lot_ids, reason: str):
+        # Лоты остаются замороженными; закрытие повторяется, пока Baserow не примет итоги
+        logger.error(f"Не удалось закрыть лоты {sorted(lot_ids)}: {reason}")
+        if admin_chat_id := os.getenv('ADMIN_TELEGRAM_ID'):
+            self._send(
+                admin_chat_id,
+                f"⚠️ Не удалось закрыть лоты {', '.join(sorted(lot_ids))}: {reason}. "
+                f"Повтор через {self.retry_interval:.0f} с или командой /close"
+            )
+        if self._job_queue is not None:
+            self._job_queue.run_once(
+                self._run_retry, when=self.retry_interval, data=sorted(lot_ids),
+                name=f"close_retry_{'_'.join(sorted(lot_ids))}"
+            )
+
+    async def close_lots(self, lot_ids: list) -> dict:
+        lot_ids = {str(lot_id) for lot_id in lot_ids} - self._closed - self._closing
+        if not lot_ids:
+            return {}
+        self._closing |= lot_ids
+        try:
+            return await self._close(lot_ids)
+        finally:
+            self._closing -= lot_ids
+
+    async def _close(self, lot_ids: set) -> dict:
+        started = datetime.now()
+        for lot_id in lot_ids:
+            # Блокировка лота дожидается ставки, которая сейчас принимается
+            await self._order_book.freeze(lot_id)
+
+        try:
+            # Один проход по ставкам: максимальная ставка каждого участника по каждому лоту
+            bids = defaultdict(dict)
+            async for bet in get_client().iter_rows(os.getenv('BASEROW_BETS_ID'), model=Bet):
+                if bet.valid and bet.lot_id in lot_ids and bet.user_id is not None:
+                    bids[bet.lot_id][bet.user_id] = max(bet.value, bids[bet.lot_id].get(bet.user_id, 0))
+            for lot_id, user_id, value in self._pending_bets():
+                if lot_id in lot_ids:
+                    bids[lot_id][user_id] = max(value, bids[lot_id].get(user_id, 0))
+
+            user_ids = {user_id for lot_bids in bids.values() for user_id in lot_bids}
+            users = await asyncio.gather(*(self._user_resolver.get_row_by_id(u) for u in user_ids))
+        except Exception as e:
+            self._retry(lot_ids, str(e))
+            return {}
+        telegram_ids = {user.id: user.telegram_id for user in users if user}
+
+        results, updates = {}, []
+        for lot_id in lot_ids:
+            lot_bids = bids.get(lot_id, {})
+            update = {'status': False}
+            if lot_bids:
+                results[lot_id] = max(lot_bids.items(), key=lambda item: item[1])
+                update['FinalPrice'] = f"{results[lot_id][1]:.0f}"
+            updates.append(get_client().update_row(os.getenv('BASEROW_LOTS_ID'), lot_id, update, strict=True))
+
+        # Лот закрыт, только когда итоги записаны в Baserow; сообщения уходят после этого,
+        # поэтому повторная попытка не разошлёт их дважды
+        winners, failed, rejected = {}, set(), {}
+        for lot_id, row in zip(lot_ids, await asyncio.gather(*updates, return_exceptions=True)):
+            if isinstance(row, BaserowRejected):
+                # Лот удалён или запись отклонена: повтор не поможет
+                rejected[lot_id] = row
+                continue
+            if row is None or isinstance(row, Exception):
+                failed.add(lot_id)
+                continue
+            self._closed.add(lot_id)
+            if lot_id not in results:
+                continue
+            winner_id, value = winners[lot_id] = results[lot_id]
+            name = self._names.get(lot_id, 'Лот')
+            for user_id in bids[lot_id]:
+                if not telegram_ids.get(user_id):
+                    continue
+                if user_id == winner_id:
+                    self._send(
+                        telegram_ids[user_id],
+                        f"🏆 Поздравляем! Вы выиграли лот «{name}» со ставкой {value:.0f} ₽.\n\n"
+                        "Мы свяжемся с вами для оформления покупки."
+                    )
+                else:
+                    self._send(
+                        telegram_ids[user_id],
+                        f"Торги по лоту «{name}» завершены. Победила ставка {value:.0f} ₽.\n\n"
+                        "Спасибо за участие!"
+                    )
+        if failed:
+            self._retry(failed, "Baserow не принял итоги торгов")
+        for lot_id, error in rejected.items():
+            self._order_book.unfreeze(lot_id)
+            logger.error(f"Лот {lot_id} не закрыт: {str(error)}")
+            if admin_chat_id := os.getenv('ADMIN_TELEGRAM_ID'):
+                self._send(admin_chat_id, f"❌ Лот {lot_id} не закрыт: Baserow отклонил запись итогов ({error.status})")
+
+        closed = len(lot_ids) - len(failed) - len(rejected)
+        elapsed = (datetime.now() - started).total_seconds()
+        logger.info(f"Закрыто лотов: {closed}, продано: {len(winners)}, за {elapsed:.1f} с")
+        if closed and (admin_chat_id := os.getenv('ADMIN_TELEGRAM_ID')):
+            self._send(admin_chat_id, f"🔨 Торги завершены: лотов {closed}, продано {len(winners)}")
+        return winners
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+from metrics import endpoint, registry
+
+logger = logging.getLogger(__name__)
+
+
+class BaserowError(Exception):
+    pass
+
+
+class BaserowUnavailable(BaserowError):
+    pass
+
+
+class BaserowRejected(BaserowError):
+    """Baserow отклонил запрос ответом 4xx (кроме 429): повтор не поможет."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold ошибок подряд.
+
+    Пока цепь разомкнута, запросы отклоняются сразу, без ожидания таймаута.
+    Через reset_timeout пропускается один пробный запрос: успех замыкает
+    цепь, ошибка продлевает разрыв.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # on_change(is_open) вызывается при размыкании и восстановлении
+        self.on_change = None
+        self._probe_at = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        # Пробный запрос один; если он оборвался без ответа, через reset_timeout пускаем следующий
+        if now - self.opened_at >= self.reset_timeout and \
+                (self._probe_at is None or now - self._probe_at >= self.reset_timeout):
+            self._probe_at = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_at = None
+        if self.opened_at is not None:
+            self.opened_at = None
+            logger.warning("Связь с Baserow восстановлена")
+            self._notify(False)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_at = None
+        if self.opened_at is not None:
+            self.opened_at = time.monotonic()
+        elif self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            logger.error(f"Baserow недоступен после {self.failures} ошибок подряд, запросы приостановлены")
+            self._notify(True)
+
+    def _notify(self, is_open: bool):
+        if self.on_change is not None:
+            try:
+                self.on_change(is_open)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика состояния Baserow: {str(e)}")
+
+
+def _parse(row, model):
+    if row is None or model is None:
+        return row
+    return model.from_row(row)
+
+
+class BaserowClient:
+    """Асинхронный клиент Baserow с общим пулом keep-alive соединений.
+
+    У каждого вида запроса свой таймаут (timeouts: read, list, write,
+    download); ошибки соединения, таймауты и ответы 5xx/429 считает
+    CircuitBreaker, и при недоступности Baserow запросы завершаются сразу.
+    """
+
+    def __init__(self, base_url: str, token: str, timeout: float = 10.0,
+                 max_connections: int = 20, max_concurrency: int = 10,
+                 transport: httpx.AsyncBaseTransport = None, timeouts: dict = None,
+                 breaker: CircuitBreaker = None):
+        # transport подменяет сетевой слой, например на заглушку Baserow в нагрузочном тесте
+        self._http = httpx.AsyncClient(
+            transport=transport,
+            base_url=base_url.rstrip('/'),
+            headers={"Authorization": f"Token {token}"},
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        # Ограничиваем число одновременных запросов, чтобы не перегружать Baserow
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeouts = {'read': timeout, 'list': timeout, 'write': timeout, 'download': timeout, **(timeouts or {})}
+        self.breaker = breaker or CircuitBreaker()
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if not self.breaker.allow():
+            raise BaserowUnavailable(f"Baserow недоступен: {method} {url}")
+        queued = time.perf_counter()
+        async with self._semaphore:
+            started = time.perf_counter()
+            registry.observe('baserow_queue_wait_seconds', started - queued)
+            status = 'error'
+            try:
+                response = await self._http.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                self.breaker.record_failure()
+                raise
+            else:
+                status = response.status_code
+                if status >= 500 or status == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return response
+            finally:
+                registry.observe(
+                    'baserow_request_duration_seconds', time.perf_counter() - started,
+                    method=method, endpoint=endpoint(url), status=status
+                )
+
+    async def _json(self, method: str, url: str, kind: str, strict: bool = False, **kwargs):
+        # strict: окончательный отказ (4xx, кроме 429) поднимает BaserowRejected вместо None
+        params = kwargs.pop('params', {})
+        params.setdefault('user_field_names', 'true')
+        try:
+            response = await self.request(method, url, params=params, timeout=self.timeouts[kind], **kwargs)
+        except BaserowUnavailable as e:
+            logger.debug(str(e))
+            return None
+        except httpx.HTTPError as e:
+            logger.error(f"Ошибка запроса к Baserow {method} {url}: {e!r}")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"Baserow {method} {url}: {response.status_code}")
+            if strict and 400 <= response.status_code < 500 and response.status_code != 429:
+                raise BaserowRejected(
+                    f"Baserow отклонил {method} {url}: {response.status_code} {response.text[:200]}",
+                    response.status_code
+                )
+            return None
+        return response.json()
+
+    async def get_row(self, table_id, row_id, model=None):
+        # model (Lot, Bet, User, Artist) разбирает строку в компактную модель
+        row = await self._json("GET", f"/database/rows/table/{table_id}/{row_id}/", 'read')
+        return _parse(row, model)
+
+    async def list_rows(self, table_id, model=None, **params):
+        data = await self._json("GET", f"/database/rows/table/{table_id}/", 'list', params=params)
+        if data is not None and model is not None:
+            data['results'] = [model.from_row(row) for row in data.get('results', [])]
+        return data
+
+    async def iter_rows(self, table_id, page_size: int = 200, model=None, **params):
+        # Постраничный обход таблицы; ошибка на любой странице прерывает обход,
+        # чтобы вызывающий код не получил неполные данные
+        page = 1
+        while True:
+            data = await self.list_rows(table_id, model=model, page=page, size=page_size, **params)
+            if data is None:
+                raise BaserowError(f"Не удалось получить страницу {page} таблицы {table_id}")
+            for row in data.get('results', []):
+                yield row
+            if not data.get('next'):
+                return
+            page += 1
+
+    async def create_row(self, table_id, data: dict, model=None, strict: bool = False):
+        row = await self._json("POST", f"/database/rows/table/{table_id}/", 'write', strict=strict, json=data)
+        return _parse(row, model)
+
+    async def update_row(self, table_id, row_id, data: dict, model=None, strict: bool = False):
+        row = await self._json("PATCH", f"/database/rows/table/{table_id}/{row_id}/", 'write', strict=strict, json=data)
+        return _parse(row, model)
+
+    async def download(self, url: str) -> bytes:
+        # Файлы лежат на внешнем хранилище — токен Baserow туда не отправляем
+        request = self._http.build_request("GET", url, timeout=self.timeouts['download'])
+        request.headers.pop("Authorization", None)
+        async with self._semaphore:
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                response = await self._http.send(request)
+                status = response.status_code
+            finally:
+                registry.observe(
+                    'baserow_request_duration_seconds', time.perf_counter() - started,
+                    method='GET', endpoint='download', status=status
+                )
+        response.raise_for_status()
+        return response.content
+
+    async def close(self):
+        await self._http.aclose()
+
+
+_client: BaserowClient = None
+
+
+def get_client() -> BaserowClient:
+    # Клиент создаётся лениво, чтобы переменные окружения уже были загружены
+    global _client
+    if _client is None:
+        _client = BaserowClient(
+            base_url=os.getenv('BASEROW_BASE_URL', ''),
+            token=os.getenv('BASEROW_TOKEN', ''),
+            timeout=float(os.getenv('BASEROW_TIMEOUT', '10')),
+            max_connections=int(os.getenv('BASEROW_MAX_CONNECTIONS', '20')),
+            max_concurrency=int(os.getenv('BASEROW_MAX_CONCURRENCY', '10')),
+            # Запросы из обработчиков короче, чтобы пользователь не ждал зависший Baserow
+            timeouts={
+                'read': float(os.getenv('BASEROW_TIMEOUT_READ', '3')),
+                'list': float(os.getenv('BASEROW_TIMEOUT_LIST', '10')),
+                'write': float(os.getenv('BASEROW_TIMEOUT_WRITE', '10')),
+                'download': float(os.getenv('BASEROW_TIMEOUT_DOWNLOAD', '15')),
+            },
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('BASEROW_BREAKER_THRESHOLD', '5')),
+                reset_timeout=float(os.getenv('BASEROW_BREAKER_RESET', '30')),
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,106 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+
+from baserow_client import get_client
+from models import Bet
+
+logger = logging.getLogger(__name__)
+
+
+class BetFeed:
+    """Поток новых ставок из Baserow, включая сделанные через веб-приложение.
+
+    Ставки приходят вебхуком Baserow (rows.created) или читаются из хвоста
+    таблицы Bets по курсору id. Каждая новая ставка сразу учитывается в
+    книге ставок; если она стала лидирующей, вызывается on_accepted, а если
+    сменила лидера — ещё и on_outbid.
+    """
+
+    def __init__(self, order_book, on_outbid, secret: str = '',
+                 poll_interval: float = 5.0, page_size: int = 200, on_accepted=None):
+        # on_outbid(previous_leader_id, lot_id, value) — уведомление перебитого,
+        # on_accepted(lot_id, placed_at) — например, продление торгов для ставок с сайта
+        self._order_book = order_book
+        self._on_outbid = on_outbid
+        self._on_accepted = on_accepted
+        self.secret = secret
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+        self.cursor = 0
+        self._count = 0
+        self._task = None
+
+    async def apply(self, bet: Bet):
+        if bet.id is not None:
+            self.cursor = max(self.cursor, bet.id)
+        if not bet.valid:
+            return
+        result = await self._order_book.observe(bet.lot_id, bet.user_id, bet.value)
+        if not result.accepted:
+            return
+        if self._on_accepted is not None:
+            self._on_accepted(bet.lot_id, bet.placed_at)
+        if result.previous_leader_id and result.previous_leader_id != bet.user_id:
+            await self._on_outbid(result.previous_leader_id, bet.lot_id, bet.value)
+
+    async def handle_webhook(self, headers: dict, body: bytes):
+        if not self.secret or not hmac.compare_digest(headers.get('x-baserow-secret', ''), self.secret):
+            return 403, 'text/plain', b''
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400, 'text/plain', b''
+        if payload.get('event_type') == 'rows.created' and \
+                str(payload.get('table_id')) == os.getenv('BASEROW_BETS_ID'):
+            for item in payload.get('items', []):
+                await self.apply(Bet.from_row(item))
+        return 200, 'application/json', b'{}'
+
+    async def poll(self):
+        # Новые строки Bets оказываются в конце таблицы: читаем страницы,
+        # начиная с предпоследней прочитанной, чтобы удаление строк не сдвинуло
+        # новые ставки за курсор страниц
+        page = max(1, (self._count - 1) // self.page_size)
+        while True:
+            data = await get_client().list_rows(
+                os.getenv('BASEROW_BETS_ID'), model=Bet, page=page, size=self.page_size
+            )
+            if data is None:
+                return
+            self._count = data.get('count', self._count)
+            for bet in data.get('results', []):
+                if (bet.id or 0) > self.cursor:
+                    await self.apply(bet)
+            if not data.get('next'):
+                return
+            page += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def seek(self, cursor: int, count: int):
+        # Позиция, с которой poll() продолжит чтение новых ставок
+        self.cursor = cursor
+        self._count = count
+
+    def start(self, cursor: int, count: int):
+        self.seek(cursor, count)
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Ошибка чтения новых ставок: {str(e)}")
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from baserow_client import BaserowRejected
+
+logger = logging.getLogger(__name__)
+
+
+class JournalEntry:
+    __slots__ = ('entry_id', 'lot_id', 'user_id', 'telegram_id', 'value', 'at', 'attempted')
+
+    def __init__(self, entry_id, lot_id, user_id, telegram_id, value, at, attempted=False):
+        self.entry_id = entry_id
+        self.lot_id = str(lot_id)
+        self.user_id = user_id
+        self.telegram_id = telegram_id
+        self.value = float(value)
+        self.at = at
+        # Запись могла дойти до Baserow: перед повтором нужна проверка
+        self.attempted = attempted
+
+    def to_record(self) -> dict:
+        return {
+            'op': 'bid', 'id': self.entry_id, 'lot': self.lot_id, 'user': self.user_id,
+            'tg': self.telegram_id, 'value': self.value, 'at': self.at
+        }
+
+
+class BidJournal:
+    """Локальный журнал принятых ставок с фоновой синхронизацией в Baserow.
+
+    Ставка считается принятой, как только её запись сброшена на диск;
+    записи, пришедшие почти одновременно, сбрасываются одним fsync.
+    Фоновая задача по порядку переносит ставки в таблицу Bets и повторяет
+    неудачные попытки с нарастающей паузой. Перед повторной отправкой
+    проверяется, не сохранена ли ставка уже: пара (пользователь, сумма)
+    в пределах лота уникальна, потому что каждая ставка выше предыдущей.
+    Ставку, которую Baserow окончательно отклонил (BaserowRejected,
+    например лот или пользователь удалены), синхронизатор переносит в
+    файл {path}.dead и переходит к следующей, не блокируя очередь.
+    """
+
+    def __init__(self, path: str, writer, exists, fsync_delay: float = 0.005,
+                 retry_base: float = 1.0, retry_max: float = 60.0, on_dead_letter=None):
+        # writer(entry) -> bool сохраняет ставку в Baserow,
+        # exists(entry) -> bool проверяет, сохранена ли она уже,
+        # on_dead_letter(entry, reason) сообщает об отклонённой ставке
+        self.path = path
+        self.dead_letter_path = f"{path}.dead"
+        self._on_dead_letter = on_dead_letter
+        self._writer = writer
+        self._exists = exists
+        self.fsync_delay = fsync_delay
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._file = None
+        self._unsynced = {}
+        self._waiters = []
+        self._fsync_task = None
+        self._fsync_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._syncer = None
+
+    def pending(self) -> list:
+        return list(self._unsynced.values())
+
+    def open(self):
+        # Восстанавливаем несинхронизированные ставки и сжимаем журнал
+        entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя строка после аварийного завершения
+                        continue
+                    if record.get('op') == 'bid':
+                        entries[record['id']] = JournalEntry(
+                            record['id'], record['lot'], record['user'],
+                            record.get('tg'), record['value'], record['at'], attempted=True
+                        )
+                    elif record.get('op') in ('synced', 'dead'):
+                        entries.pop(record['id'], None)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries.values():
+                f.write(json.dumps(entry.to_record(), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._unsynced = entries
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if entries:
+            logger.info(f"В журнале ставок найдено несинхронизированных записей: {len(entries)}")
+
+    def _fsync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _group_fsync(self):
+        await asyncio.sleep(self.fsync_delay)
+        self._fsync_task = None
+        waiters, self._waiters = self._waiters, []
+        try:
+            async with self._fsync_lock:
+                # Буфер сбрасывается в потоке цикла событий, в отдельный
+                # поток уходит только сам fsync
+                self._file.flush()
+                await asyncio.to_thread(os.fsync, self._file.fileno())
+        except Exception as e:
+            for waiter in waiters:
+                waiter.set_exception(e)
+            return
+        for waiter in waiters:
+            waiter.set_result(True)
+
+    def _write(self, record: dict) -> asyncio.Future:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._fsync_task is None:
+            self._fsync_task = asyncio.create_task(self._group_fsync())
+        return waiter
+
+    async def append(self, lot_id, user_id: int, telegram_id: int, value: float) -> bool:
+        entry = JournalEntry(uuid.uuid4().hex, lot_id, user_id, telegram_id, value, datetime.now().isoformat())
+        try:
+            await self._write(entry.to_record())
+        except Exception as e:
+            logger.error(f"Ошибка записи ставки в журнал: {str(e)}")
+            return False
+        self._unsynced[entry.entry_id] = entry
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        self._syncer = asyncio.create_task(self._sync_loop())
+
+    async def stop(self, timeout: float = 10.0):
+        if self._syncer is not None:
+            try:
+                await asyncio.wait_for(self._drain(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Ставки остались в журнале до следующего запуска: {len(self._unsynced)}")
+            self._syncer.cancel()
+            await asyncio.gather(self._syncer, return_exceptions=True)
+            self._syncer = None
+        if self._fsync_task is not None:
+            await self._fsync_task
+        if self._file is not None:
+            self._fsync()
+            self._file.close()
+            self._file = None
+
+    async def _drain(self):
+        while self._unsynced:
+            await asyncio.sleep(0.1)
+
+    async def _sync_one(self, entry: JournalEntry) -> bool:
+        if entry.attempted and await self._exists(entry):
+            return True
+        entry.attempted = True
+        return await self._writer(entry)
+
+    def _write_dead_letter(self, record: dict):
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _dead_letter(self, entry: JournalEntry, reason: str):
+        logger.error(f"Ставка {entry.entry_id} отклонена Baserow и перенесена в {self.dead_letter_path}: {reason}")
+        try:
+            await asyncio.to_thread(self._write_dead_letter, {**entry.to_record(), 'error': reason})
+        except OSError as e:
+            # Без записи в файл ставку из журнала не убираем, повторим позже
+            logger.error(f"Ошибка записи в {self.dead_letter_path}: {str(e)}")
+            await asyncio.sleep(self.retry_max)
+            return
+        self._unsynced.pop(entry.entry_id, None)
+        self._file.write(json.dumps({'op': 'dead', 'id': entry.entry_id}) + "\n")
+        if self._on_dead_letter is not None:
+            try:
+                self._on_dead_letter(entry, reason)
+            except Exception as e:
+                logger.error(f"Ошибка уведомления об отклонённой ставке: {str(e)}")
+
+    async def _sync_loop(self):
+        failures = 0
+        while True:
+            if not self._unsynced:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            entry = next(iter(self._unsynced.values()))
+            try:
+                synced = await self._sync_one(entry)
+            except BaserowRejected as e:
+                failures = 0
+                await self._dead_letter(entry, str(e))
+                continue
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации ставки {entry.entry_id}: {str(e)}")
+                synced = False
+            if not synced:
+                failures += 1
+                await asyncio.sleep(min(self.retry_base * 2 ** (failures - 1), self.retry_max))
+                continue
+            failures = 0
+            self._unsynced.pop(entry.entry_id, None)
+            # Отметка о синхронизации не требует немедленного fsync:
+            # при её потере повтор отсечёт проверка существования
+            self._file.write(json.dumps({'op': 'synced', 'id': entry.entry_id}) + "\n")
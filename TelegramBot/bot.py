@@ -1,6 +1,6 @@
+import asyncio
 import logging
 import os
-import requests
 import traceback
 from telegram.constants import ParseMode
 from datetime import datetime
@@ -20,6 +20,25 @@ from telegram.ext import (
 )
 from dotenv import load_dotenv
 
+from baserow_client import BaserowError, BaserowRejected, get_client, close_client
+from admin_digest import AdminDigest, DigestEntry
+from auction_close import AuctionCloseEngine
+from bet_feed import BetFeed
+from bid_journal import BidJournal
+from broadcast import AUDIENCES, Broadcast, BroadcastRunner, BroadcastStore
+from cache import TTLCache
+from http_server import HttpServer
+from lot_cards import LotCard, LotCardCache
+from metrics import registry
+from models import Artist, Bet, Lot, User
+from notifications import NotificationQueue
+from order_book import OrderBook
+from persistence import SQLitePersistence
+from rate_limit import RateLimiter
+from snapshot import SnapshotStore
+from update_processor import ChatOrderedUpdateProcessor
+from user_resolver import UserResolver
+
 load_dotenv()
 
 logging.basicConfig(
@@ -28,7 +47,115 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+user_resolver = UserResolver()
+
+# Метаданные лотов и художников во время аукциона практически не меняются
+lot_cache = TTLCache(
+    maxsize=int(os.getenv('LOT_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('LOT_CACHE_TTL', '300'))
+)
+artist_cache = TTLCache(
+    maxsize=int(os.getenv('ARTIST_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('ARTIST_CACHE_TTL', '3600'))
+)
+# Ограничение частоты ставок проверяется до любых запросов к Baserow
+user_rate_limiter = RateLimiter(
+    rate=float(os.getenv('BID_RATE_PER_USER', '1')),
+    burst=float(os.getenv('BID_BURST_PER_USER', '3'))
+)
+lot_rate_limiter = RateLimiter(
+    rate=float(os.getenv('BID_RATE_PER_LOT', '20')),
+    burst=float(os.getenv('BID_BURST_PER_LOT', '40'))
+)
+# lot_id → (имя файла в Baserow, file_id в Telegram)
+lot_photo_ids = {}
+# Карточки лотов для ссылок с сайта, пересобираются при смене лота или цены
+lot_cards = LotCardCache(
+    render=lambda lot_id, lot, price: render_lot_card(lot_id, lot, price),
+    maxsize=int(os.getenv('LOT_CARD_CACHE_SIZE', '512'))
+)
+# Источник истины для текущего лидера; функции объявлены ниже
+order_book = OrderBook(loader=lambda lot_id: load_lot_max(lot_id))
+# Ставка подтверждается после записи в локальный журнал, в Baserow она уходит в фоне
+bid_journal = BidJournal(
+    os.getenv('BID_JOURNAL_PATH', 'bids.journal'),
+    writer=lambda entry: add_bet_to_baserow(entry.lot_id, entry.user_id, entry.value, entry.at),
+    exists=lambda entry: bet_exists_in_baserow(entry.lot_id, entry.user_id, entry.value),
+    on_dead_letter=lambda entry, reason: on_bet_rejected(entry, reason)
+)
+notification_queue = NotificationQueue(
+    workers=int(os.getenv('NOTIFY_WORKERS', '4')),
+    global_rate=float(os.getenv('NOTIFY_GLOBAL_RATE', '25')),
+    per_chat_interval=float(os.getenv('NOTIFY_CHAT_INTERVAL', '1')),
+    max_retries=int(os.getenv('NOTIFY_MAX_RETRIES', '5'))
+)
+# Ставки, сделанные через веб-приложение, попадают в книгу без опроса на каждую ставку
+bet_feed = BetFeed(
+    order_book,
+    on_outbid=lambda leader_id, lot_id, value: notify_outbid(leader_id, lot_id, value),
+    secret=os.getenv('BASEROW_WEBHOOK_SECRET', ''),
+    poll_interval=float(os.getenv('BET_FEED_POLL_INTERVAL', '5')),
+    # Антиснайпинг действует и для ставок, сделанных на сайте
+    on_accepted=lambda lot_id, placed_at: auction_close.soft_close(lot_id, placed_at)
+)
+auction_close = AuctionCloseEngine(
+    order_book,
+    user_resolver,
+    send=lambda chat_id, text: notification_queue.enqueue(chat_id, text),
+    pending_bets=lambda: [(e.lot_id, e.user_id, e.value) for e in bid_journal.pending()],
+    tz=os.getenv('AUCTION_TZ', 'Europe/Moscow'),
+    soft_close_window=float(os.getenv('SOFT_CLOSE_WINDOW', '0')),
+    soft_close_extension=float(os.getenv('SOFT_CLOSE_EXTENSION', '300')),
+    retry_interval=float(os.getenv('AUCTION_CLOSE_RETRY', '60'))
+)
+broadcast_runner = BroadcastRunner(
+    BroadcastStore(os.getenv('BROADCAST_STATE_PATH', 'bot_state.sqlite3')),
+    send=lambda chat_id, text: notification_queue.send_now(chat_id, text),
+    order_book=order_book,
+    user_resolver=user_resolver
+)
+# Прогретое состояние переживает перезапуск; пустой SNAPSHOT_PATH отключает снимок
+snapshot_store = SnapshotStore(
+    os.getenv('SNAPSHOT_PATH', 'bot_snapshot.json'),
+    interval=float(os.getenv('SNAPSHOT_INTERVAL', '60')),
+    max_age=float(os.getenv('SNAPSHOT_MAX_AGE', '21600'))
+) if os.getenv('SNAPSHOT_PATH', 'bot_snapshot.json') else None
+http_server = HttpServer(os.getenv('HTTP_LISTEN', '127.0.0.1'), int(os.getenv('HTTP_PORT', '8081')))
+registry.describe('bot_handler_duration_seconds', 'Время обработки апдейта Telegram')
+registry.describe('baserow_request_duration_seconds', 'Время ответа Baserow')
+registry.describe('baserow_queue_wait_seconds', 'Ожидание свободного слота для запроса к Baserow')
+registry.describe('telegram_send_duration_seconds', 'Время отправки сообщения из очереди уведомлений')
+for cache_name, cache in (('lot', lot_cache), ('artist', artist_cache)):
+    registry.gauge('bot_cache_hit_ratio', lambda c=cache: c.stats()['hit_rate'], cache=cache_name)
+    registry.gauge('bot_cache_hits', lambda c=cache: c.hits, cache=cache_name)
+    registry.gauge('bot_cache_misses', lambda c=cache: c.misses, cache=cache_name)
+    registry.gauge('bot_cache_size', lambda c=cache: c.stats()['size'], cache=cache_name)
+registry.gauge('bot_cache_hits', lambda: lot_cards.hits, cache='lot_card')
+registry.gauge('bot_cache_misses', lambda: lot_cards.misses, cache='lot_card')
+registry.gauge('baserow_circuit_open', lambda: get_client().breaker.is_open)
+registry.gauge('bot_notification_queue_depth', lambda: notification_queue.qsize())
+registry.gauge('bot_bid_journal_pending', lambda: len(bid_journal.pending()))
+admin_digest = AdminDigest(
+    send=lambda text: notification_queue.enqueue(os.getenv('ADMIN_TELEGRAM_ID'), text, parse_mode=ParseMode.HTML),
+    window=float(os.getenv('ADMIN_DIGEST_WINDOW', '0'))
+)
+
 
+# Пока Baserow недоступен, бот отвечает из кеша и предупреждает, что данные могут устареть
+STALE_NOTE = "\n\n⚠️ Нет связи с сервером аукциона: цена может быть неактуальной."
+QUEUED_NOTE = "\n\n⚠️ Связь с сервером аукциона временно нарушена: ставка сохранена и будет записана автоматически."
+UNAVAILABLE_TEXT = "⚠️ Сервер аукциона временно недоступен. Попробуйте через несколько минут."
+
+def baserow_degraded() -> bool:
+    return get_client().breaker.is_open
+
+def on_baserow_state_change(is_open: bool):
+    if admin_chat_id := os.getenv('ADMIN_TELEGRAM_ID'):
+        notification_queue.enqueue(
+            admin_chat_id,
+            "⚠️ Baserow недоступен, бот работает в режиме деградации" if is_open else "✅ Связь с Baserow восстановлена",
+            coalesce_key=('baserow_state',)
+        )
 
 async def get_user_profile_photo(user_id: int, bot) -> str:
     try:
@@ -38,12 +165,7 @@ async def get_user_profile_photo(user_id: int, bot) -> str:
         logger.error(f"Ошибка получения аватара: {str(e)}")
         return ""
 
-def add_user_to_baserow(telegram_id: int, username: str, profile_image_url: str) -> bool:
-    url = f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_USERS_ID')}/?user_field_names=true"
-    headers = {
-        "Authorization": f"Token {os.getenv('BASEROW_TOKEN')}",
-        "Content-Type": "application/json"
-    }
+async def add_user_to_baserow(telegram_id: int, username: str, profile_image_url: str) -> bool:
     data = {
         "TelegramID": telegram_id,
         "Username": username,
@@ -51,103 +173,170 @@ def add_user_to_baserow(telegram_id: int, username: str, profile_image_url: str)
     }
     try:
         logger.info(f"Попытка регистрации пользователя {telegram_id}")
-        response = requests.post(url, headers=headers, json=data)
-        logger.info(f"Добавление пользователя: {response.status_code}")
-        return response.status_code == 200
+        created = await get_client().create_row(os.getenv('BASEROW_USERS_ID'), data, model=User)
+        logger.info(f"Добавление пользователя: {'ok' if created else 'ошибка'}")
+        user_resolver.remember(created)
+        return created is not None
     except Exception as e:
         logger.error(f"Ошибка регистрации: {str(e)}")
         return False
 
-def fetch_lot_data_by_lot_id(lot_id: str):
+async def fetch_lot_data_by_lot_id(lot_id: str) -> Lot:
+    if (lot := lot_cache.get(lot_id)) is not None:
+        return lot
     try:
-        url = f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_LOTS_ID')}/{lot_id}/?user_field_names=true"
-        response = requests.get(url, headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"})
-        logger.info(f"Получение лота {lot_id}: {response.status_code}")
-        return response.json() if response.status_code == 200 else None
+        lot = await get_client().get_row(os.getenv('BASEROW_LOTS_ID'), lot_id, model=Lot)
+        logger.info(f"Получение лота {lot_id}: {'ok' if lot else 'не найден'}")
+        if lot:
+            lot_cache.set(lot_id, lot)
+        elif baserow_degraded():
+            return lot_cache.get_stale(lot_id)
+        return lot
     except Exception as e:
         logger.error(f"Ошибка получения лота: {str(e)}")
         return None
 
-def get_artist_display_name(artist_id: str) -> str:
+async def get_artist_display_name(artist_id: str) -> str:
+    if (display_name := artist_cache.get(artist_id)) is not None:
+        return display_name
     try:
-        url = f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_ARTISTS_ID')}/{artist_id}/?user_field_names=true"
-        response = requests.get(url, headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"})
-        if response.status_code == 200:
-            return response.json().get('displayName', 'Нет данных')
+        artist = await get_client().get_row(os.getenv('BASEROW_ARTISTS_ID'), artist_id, model=Artist)
+        if artist:
+            artist_cache.set(artist_id, artist.display_name)
+            return artist.display_name
+        if baserow_degraded():
+            return artist_cache.get_stale(artist_id) or 'Нет данных'
         return 'Нет данных'
     except Exception as e:
         logger.error(f"Ошибка получения художника: {str(e)}")
         return 'Нет данных'
 
-def get_user_baserow_id(telegram_id: int) -> int:
-    logger.debug(f"Поиск пользователя {telegram_id} в Baserow")
+async def get_artist_display_names(artist_ids: list) -> list:
+    # Имена запрашиваются параллельно; число одновременных запросов
+    # ограничено семафором клиента Baserow
+    return list(await asyncio.gather(*(get_artist_display_name(a) for a in artist_ids)))
+
+async def render_lot_card(lot_id: str, lot: Lot, price: float) -> LotCard:
+    artists = ", ".join(await get_artist_display_names(lot.artist_ids))
+    header = (
+        f"Автор: {artists or 'Нет данных'}\n"
+        f"Лот: {lot.name}\n"
+        f"Номер: {lot.number or 'Нет данных'}\n\n"
+        f"Начальная цена: {lot.initial_price} ₽\n"
+        f"Текущая цена: {price} ₽"
+    )
+    keyboard = [[InlineKeyboardButton(
+        "🖼 Открыть лот в приложении",
+        web_app=WebAppInfo(url=f"https://aspyart.com/artworks/{lot_id}")
+    )]]
+    return LotCard(
+        header=header,
+        footer="\n\nВведите сумму ставки:",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        price=price,
+        lot=lot
+    )
+
+async def send_lot_photo(message, lot_id: str, lot: Lot, caption: str, reply_markup=None) -> bool:
+    # После первой загрузки Telegram отдаёт file_id — повторно байты не отправляем.
+    # Ссылки Baserow на файлы могут быть подписанными, поэтому сверяем имя файла
+    image_url, image_key = lot.image_url, lot.image_name
+    cached = lot_photo_ids.get(str(lot_id))
+    if cached and cached[0] == image_key:
+        try:
+            await message.reply_photo(cached[1], caption=caption, reply_markup=reply_markup)
+            return True
+        except Exception as e:
+            logger.warning(f"Не удалось отправить фото по file_id: {str(e)}")
+            lot_photo_ids.pop(str(lot_id), None)
+
+    # Сначала даём Telegram скачать изображение по ссылке, затем — из памяти
+    for source in ('url', 'memory'):
+        try:
+            photo = image_url if source == 'url' else await get_client().download(image_url)
+            sent = await message.reply_photo(photo, caption=caption, reply_markup=reply_markup)
+            if sent.photo:
+                lot_photo_ids[str(lot_id)] = (image_key, sent.photo[-1].file_id)
+            return True
+        except Exception as e:
+            logger.warning(f"Ошибка загрузки изображения ({source}): {str(e)}")
+    return False
+
+async def get_user_row(user_baserow_id: int):
     try:
-        url = f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_USERS_ID')}/?user_field_names=true"
-        response = requests.get(url, headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"})
-        for user in response.json().get('results', []):
-            if str(user.get('TelegramID')) == str(telegram_id):
-                return user.get('id')
-        return None
+        return await user_resolver.get_row_by_id(user_baserow_id)
     except Exception as e:
-        logger.error(f"Ошибка поиска пользователя: {str(e)}")
+        logger.error(f"Ошибка получения данных пользователя: {str(e)}")
         return None
 
-def get_max_bet_info(lot_id: str, initial_price: float) -> tuple:
-    try:
-        logger.info(f"Запрос ставок для лота {lot_id}")
-        url = f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_BETS_ID')}/?user_field_names=true"
-        response = requests.get(url, headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"})
-        bets = [
-            bet for bet in response.json().get('results', [])
-            if bet.get('Lot', [{}])[0].get('id') == int(lot_id)
-        ]
-        
-        valid_bets = []
-        for bet in bets:
-            try:
-                bet_value = float(bet.get('BetValue', 0))
-                valid_bets.append((bet_value, bet))
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Некорректная ставка: {str(e)}")
-                continue
-
-        if not valid_bets:
-            logger.info("Нет валидных ставок")
-            return (float(initial_price), None)
-            
-        max_bet = max(valid_bets, key=lambda x: x[0])
-        user_id = max_bet[1].get('User', [{}])[0].get('id')
-        logger.info(f"Максимальная ставка: {max_bet[0]} от пользователя {user_id}")
-        return (max_bet[0], user_id)
-    except Exception as e:
-        logger.error(f"Ошибка получения ставок: {str(e)}")
-        return (float(initial_price), None)
+async def get_user_baserow_id(telegram_id: int) -> int:
+    # None — пользователь не зарегистрирован; если Baserow не ответил, поднимается BaserowError
+    return await user_resolver.resolve(telegram_id)
+
+async def get_max_bet_info(lot_id: str) -> tuple:
+    logger.info(f"Запрос ставок для лота {lot_id}")
+    # Фильтр по лоту выполняется на стороне Baserow: читаем только ставки этого лота
+    max_bet = None
+    async for bet in get_client().iter_rows(
+        os.getenv('BASEROW_BETS_ID'),
+        model=Bet,
+        filter__Lot__link_row_has=int(lot_id)
+    ):
+        if not bet.valid:
+            logger.warning(f"Некорректная ставка: {bet.id}")
+            continue
+        if max_bet is None or bet.value > max_bet[0]:
+            max_bet = (bet.value, bet.user_id)
 
-async def notify_previous_leader(bot, user_baserow_id: int, lot_data: dict, new_bet: float, lot_id: str):
+    if max_bet is None:
+        logger.info("Нет валидных ставок")
+        return (None, None)
+
+    logger.info(f"Максимальная ставка: {max_bet[0]} от пользователя {max_bet[1]}")
+    return max_bet
+
+async def load_lot_max(lot_id: str) -> tuple:
+    # Ставки из журнала, ещё не дошедшие до Baserow, тоже учитываются
+    max_bet, leader_id = await get_max_bet_info(lot_id)
+    for entry in bid_journal.pending():
+        if entry.lot_id == str(lot_id) and (max_bet is None or entry.value > max_bet):
+            max_bet, leader_id = entry.value, entry.user_id
+    return (max_bet, leader_id)
+
+async def bet_exists_in_baserow(lot_id: str, user_baserow_id: int, bet_value: float) -> bool:
+    async for bet in get_client().iter_rows(
+        os.getenv('BASEROW_BETS_ID'),
+        model=Bet,
+        filter__Lot__link_row_has=int(lot_id)
+    ):
+        if bet.user_id == user_baserow_id and bet.value == bet_value:
+            return True
+    return False
+
+async def notify_previous_leader(user_baserow_id: int, lot: Lot, new_bet: float, lot_id: str):
     try:
         logger.info(f"Уведомление пользователя {user_baserow_id}")
-        url = f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_USERS_ID')}/{user_baserow_id}/?user_field_names=true"
-        response = requests.get(url, headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"})
-        
-        if response.status_code != 200:
-            logger.error(f"Ошибка получения данных пользователя: {response.status_code}")
+        user_row = await get_user_row(user_baserow_id)
+        if not user_row:
+            logger.error(f"Пользователь {user_baserow_id} не найден")
             return
 
-        user_data = response.json()
-        telegram_id = user_data.get('TelegramID')
+        telegram_id = user_row.telegram_id
         if not telegram_id:
             logger.error("Telegram ID не найден")
             return
 
         from telegram.helpers import escape_markdown
-        lot_name = escape_markdown(lot_data.get('Name', 'Лот'), version=2)
+        lot_name = escape_markdown(lot.name or 'Лот', version=2)
         escaped_bet = escape_markdown(f"{new_bet:.0f}", version=2)
         
         keyboard = [[InlineKeyboardButton("💰 Повысить ставку", callback_data=f"raise_bet_{lot_id}")]]
         
-        await bot.send_message(
-            chat_id=telegram_id,
-            text=f"♦️ Ваша ставка на лот *«{lot_name}»* перебита\!\nНовая ставка: *{escaped_bet} ₽*",
+        # Повторные уведомления по одному лоту заменяют ещё не отправленное
+        notification_queue.enqueue(
+            telegram_id,
+            f"♦️ Ваша ставка на лот *«{lot_name}»* перебита\!\nНовая ставка: *{escaped_bet} ₽*",
+            coalesce_key=('outbid', str(telegram_id), str(lot_id)),
             parse_mode="MarkdownV2",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
@@ -155,15 +344,59 @@ async def notify_previous_leader(bot, user_baserow_id: int, lot_data: dict, new_
     except Exception as e:
         logger.error(f"Ошибка уведомления: {str(e)}\n{traceback.format_exc()}")
 
+async def notify_outbid(user_baserow_id: int, lot_id: str, new_bet: float):
+    lot = await fetch_lot_data_by_lot_id(lot_id)
+    if lot:
+        await notify_previous_leader(user_baserow_id, lot, new_bet, lot_id)
+
+async def notify_admin(user, user_baserow_id: int, lot_id: str, lot: Lot, bet_value: float):
+    if not os.getenv('ADMIN_TELEGRAM_ID'):
+        logger.warning("Не указан ADMIN_TELEGRAM_ID в .env")
+        return
+    try:
+        user_row = await get_user_row(user_baserow_id)
+        admin_digest.add(DigestEntry(
+            lot_id=str(lot_id),
+            lot_name=(lot.name if lot else '') or 'Нет данных',
+            lot_number=(lot.number if lot else '') or 'Нет данных',
+            bet_value=bet_value,
+            telegram_id=user.id,
+            username=user.username or (user_row and user_row.username) or 'нет',
+            phone=(user_row and user_row.phone) or 'не указан',
+            at=datetime.now()
+        ))
+    except Exception as e:
+        logger.error(f"Ошибка отправки уведомления админу: {str(e)}")
+
+async def check_rate_limit(update: Update, context: ContextTypes.DEFAULT_TYPE, lot_id) -> bool:
+    allowed = user_rate_limiter.allow(update.effective_user.id) and \
+        (lot_id is None or lot_rate_limiter.allow(str(lot_id)))
+    if allowed:
+        context.user_data.pop('rate_limited', None)
+        return True
+    registry.inc('bot_rate_limited_total')
+    # Предупреждаем один раз, чтобы поток сообщений не превращался в поток ответов
+    if not context.user_data.get('rate_limited'):
+        context.user_data['rate_limited'] = True
+        await update.effective_message.reply_text("⏳ Слишком много ставок подряд. Подождите немного.")
+    return False
+
+@registry.timed('bot_handler_duration_seconds', handler='handle_button_click')
 async def handle_button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         query = update.callback_query
         await query.answer()
         _, lot_id = query.data.split('_', 2)[-2:]
+
+        if not await check_rate_limit(update, context, lot_id):
+            return
         
-        lot_data = fetch_lot_data_by_lot_id(lot_id)
-        if not lot_data:
-            await query.message.reply_text("❌ Лот не найден")
+        lot = await fetch_lot_data_by_lot_id(lot_id)
+        if not lot:
+            await query.message.reply_text(UNAVAILABLE_TEXT if baserow_degraded() else "❌ Лот не найден")
+            return
+        if auction_close.is_closed(lot_id):
+            await query.message.reply_text("⛔ Торги по этому лоту завершены")
             return
             
         context.user_data.update({
@@ -172,13 +405,14 @@ async def handle_button_click(update: Update, context: ContextTypes.DEFAULT_TYPE
         })
         
         await query.message.reply_text(
-            f"Введите сумму для лота №{lot_data.get('LotNumber', '')}:"
+            f"Введите сумму для лота №{lot.number}:"
         )
         
     except Exception as e:
         logger.error(f"Ошибка обработки кнопки: {str(e)}\n{traceback.format_exc()}")
         await query.message.reply_text("❌ Ошибка. Попробуйте снова.")
 
+@registry.timed('bot_handler_duration_seconds', handler='start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user = update.effective_user
@@ -215,82 +449,72 @@ async def handle_bet_command(update: Update, context: ContextTypes.DEFAULT_TYPE,
         logger.info(f"Обработка лота {lot_id} для {user.id}, начальная ставка: {initial_amount}")
         
         # Регистрация нового пользователя
-        if not get_user_baserow_id(user.id):
+        try:
+            registered = await get_user_baserow_id(user.id)
+        except BaserowError as e:
+            # Повторная регистрация создала бы дубль в таблице Users
+            logger.error(f"Ошибка поиска пользователя: {str(e)}")
+            await update.message.reply_text(UNAVAILABLE_TEXT)
+            return
+        if not registered:
             profile_image = await get_user_profile_photo(user.id, context.bot)
-            if not add_user_to_baserow(user.id, user.username, profile_image):
-                await update.message.reply_text("❌ Ошибка регистрации")
+            if not await add_user_to_baserow(user.id, user.username, profile_image):
+                await update.message.reply_text(UNAVAILABLE_TEXT if baserow_degraded() else "❌ Ошибка регистрации")
                 return
 
-        lot_data = fetch_lot_data_by_lot_id(lot_id)
-        if not lot_data:
-            await update.message.reply_text("❌ Лот не найден")
+        lot = await fetch_lot_data_by_lot_id(lot_id)
+        if not lot:
+            await update.message.reply_text(UNAVAILABLE_TEXT if baserow_degraded() else "❌ Лот не найден")
+            return
+        if auction_close.is_closed(lot_id):
+            await update.message.reply_text("⛔ Торги по этому лоту завершены")
             return
 
-        # Формирование информации о лоте
-        artists = ", ".join([get_artist_display_name(a.get('id')) for a in lot_data.get('Artists', []) if a.get('id')])
-        initial_price = float(lot_data.get('InitialPrice', 0))
-        current_max, _ = get_max_bet_info(lot_id, initial_price)
-        
-        # Подготовка сообщения с учетом ставки с сайта
-        suggested_amount = ""
-        if initial_amount:
-            try:
-                amount_float = float(initial_amount)
-                if amount_float > current_max:
-                    suggested_amount = f"\nПредложенная ставка: {amount_float} ₽"
-            except ValueError:
-                pass
-                
-        message = (
-            f"Автор: {artists or 'Нет данных'}\n"
-            f"Лот: {lot_data['Name']}\n"
-            f"Номер: {lot_data.get('LotNumber', 'Нет данных')}\n\n"
-            f"Начальная цена: {initial_price} ₽\n"
-            f"Текущая цена: {current_max} ₽{suggested_amount}\n\n"
-            f"Введите сумму ставки:"
-        )
-
-        # Отправка изображения если есть
-        if image_url := lot_data.get('Image', [{}])[0].get('url'):
-            try:
-                response = requests.get(image_url)
-                with open("temp_img.jpg", "wb") as f:
-                    f.write(response.content)
-                await update.message.reply_photo(open("temp_img.jpg", "rb"), caption=message)
-                os.remove("temp_img.jpg")
-            except Exception as e:
-                logger.error(f"Ошибка загрузки изображения: {str(e)}")
-                await update.message.reply_text(message)
-        else:
-            await update.message.reply_text(message)
+        try:
+            current_max, _ = await order_book.get(lot_id, lot.initial_price)
+        except BaserowError as e:
+            logger.error(f"Не удалось получить ставки лота {lot_id}: {str(e)}")
+            await update.message.reply_text(UNAVAILABLE_TEXT)
+            return
+        card = await lot_cards.get(lot_id, lot, current_max)
 
-        # Сохраняем начальную ставку, если она была передана и валидна
+        # Ставка с сайта подставляется в готовую карточку, ответ — одно сообщение
         context_data = {'lot_id': lot_id, 'user_id': user.id}
-        
+        suggested_amount, hint = "", ""
         if initial_amount:
             try:
                 amount_float = float(initial_amount)
                 if amount_float > current_max:
-                    # Автоматически подставляем ставку из URL
                     context_data['initial_bet_value'] = amount_float
-                    await update.message.reply_text(
-                        f"💡 Для подтверждения ставки {amount_float} ₽, просто отправьте её или введите другую сумму."
-                    )
+                    suggested_amount = f"\nПредложенная ставка: {amount_float} ₽"
+                    hint = f"\n\n💡 Для подтверждения ставки {amount_float} ₽, просто отправьте её или введите другую сумму."
             except ValueError:
                 pass
-                
+        message = card.header + suggested_amount + card.footer + hint
+        if baserow_degraded():
+            message += STALE_NOTE
+
+        if not lot.image_url or not await send_lot_photo(
+            update.message, lot_id, lot, message, reply_markup=card.reply_markup
+        ):
+            await update.message.reply_text(message, reply_markup=card.reply_markup)
+
         context.user_data.update(context_data)
 
     except Exception as e:
         logger.error(f"Ошибка обработки команды: {str(e)}\n{traceback.format_exc()}")
         await update.message.reply_text("❌ Произошла ошибка")
 
+@registry.timed('bot_handler_duration_seconds', handler='handle_bet_value')
 async def handle_bet_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user = update.effective_user
         lot_id = context.user_data.get('lot_id')
         logger.info(f"Обработка ставки от {user.id} для лота {lot_id}")
 
+        if not await check_rate_limit(update, context, lot_id):
+            return
+
         if not lot_id or context.user_data.get('user_id') != user.id:
             await update.message.reply_text("❌ Сессия устарела. Начните заново.")
             return
@@ -299,6 +523,10 @@ async def handle_bet_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await handle_phone_input(update, context)
             return
 
+        if auction_close.is_closed(lot_id):
+            await update.message.reply_text("⛔ Торги по этому лоту завершены")
+            return
+
         # Проверка, если пользователь отправил сообщение "Подтвердить" 
         # или просто нажал кнопку подтверждения
         initial_bet = context.user_data.get('initial_bet_value')
@@ -322,17 +550,32 @@ async def handle_bet_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     await update.message.reply_text("❌ Введите корректную сумму")
                 return
 
-        # Получение данных лота
-        lot_data = fetch_lot_data_by_lot_id(lot_id)
-        initial_price = float(lot_data.get('InitialPrice', 0)) if lot_data else 0
+        # Получение данных лота: без стартовой цены максимум лота неизвестен
+        lot = await fetch_lot_data_by_lot_id(lot_id)
+        if not lot:
+            await update.message.reply_text(UNAVAILABLE_TEXT)
+            return
         
         # Проверка текущих ставок
-        current_max, previous_leader_id = get_max_bet_info(lot_id, initial_price)
-        user_baserow_id = get_user_baserow_id(user.id)
+        try:
+            current_max, previous_leader_id = await order_book.get(lot_id, lot.initial_price)
+        except BaserowError as e:
+            # Без известного максимума ставку принять нельзя: показали бы неверную цену
+            logger.error(f"Не удалось получить ставки лота {lot_id}: {str(e)}")
+            await update.message.reply_text(UNAVAILABLE_TEXT)
+            return
+        try:
+            user_baserow_id = await get_user_baserow_id(user.id)
+        except BaserowError as e:
+            logger.error(f"Ошибка поиска пользователя: {str(e)}")
+            await update.message.reply_text(UNAVAILABLE_TEXT)
+            return
 
         # Валидация ставки
         if bet_value <= current_max:
-            await update.message.reply_text(f"📉 Ставка должна быть выше {current_max} ₽")
+            await update.message.reply_text(
+                f"📉 Ставка должна быть выше {current_max} ₽{STALE_NOTE if baserow_degraded() else ''}"
+            )
             return
             
         if user_baserow_id == previous_leader_id:
@@ -347,10 +590,9 @@ async def handle_bet_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
         })
 
         # Проверка номера телефона
-        user_data_url = f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_USERS_ID')}/{user_baserow_id}/?user_field_names=true"
-        response = requests.get(user_data_url, headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"})
+        user_row = await get_user_row(user_baserow_id)
         
-        if response.status_code != 200 or not response.json().get('PhoneNumber'):
+        if not user_row or not user_row.phone:
             context.user_data['awaiting_phone'] = True
             await update.message.reply_text("📱 Введите номер телефона (79XXXXXXXXX):")
             return
@@ -361,6 +603,7 @@ async def handle_bet_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка обработки ставки: {str(e)}\n{traceback.format_exc()}")
         await update.message.reply_text("❌ Произошла ошибка")
 
+@registry.timed('bot_handler_duration_seconds', handler='handle_phone_input')
 async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user = update.effective_user
@@ -370,7 +613,7 @@ async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("❌ Неверный формат номера")
             return
             
-        if not update_user_phone_number(user.id, phone):
+        if not await update_user_phone_number(user.id, phone):
             await update.message.reply_text("❌ Ошибка сохранения номера")
             return
 
@@ -390,12 +633,17 @@ async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.error(f"Ошибка обработки телефона: {str(e)}\n{traceback.format_exc()}")
         await update.message.reply_text("❌ Критическая ошибка")
 
+def clear_bet_context(context):
+    context.user_data.pop('previous_leader_id', None)
+    context.user_data.pop('previous_max', None)
+    context.user_data.pop('bet_value', None)
+
+@registry.timed('bot_handler_duration_seconds', handler='process_bet')
 async def process_bet(context, update, lot_id, user_id):
     try:
         logger.info(f"Обработка ставки для лота {lot_id}")
         
         # Получение данных из контекста
-        previous_leader_id = context.user_data.get('previous_leader_id')
         previous_max = context.user_data.get('previous_max')
         bet_value = context.user_data.get('bet_value')
         
@@ -405,54 +653,59 @@ async def process_bet(context, update, lot_id, user_id):
             await update.message.reply_text("❌ Ошибка обработки")
             return
 
-        # Сохранение ставки
-        user_baserow_id = get_user_baserow_id(user_id)
-        if not user_baserow_id or not add_bet_to_baserow(lot_id, user_id, bet_value):
+        # Сохранение ставки: проверка максимума и смена лидера выполняются
+        # атомарно под блокировкой лота
+        try:
+            user_baserow_id = await get_user_baserow_id(user_id)
+        except BaserowError as e:
+            logger.error(f"Ошибка поиска пользователя: {str(e)}")
+            await update.message.reply_text(UNAVAILABLE_TEXT)
+            return
+        if not user_baserow_id:
             await update.message.reply_text("❌ Ошибка сохранения ставки")
             return
 
-        # Уведомление предыдущего лидера (если есть)
-        if previous_leader_id and previous_leader_id != user_baserow_id:
-            lot_data = fetch_lot_data_by_lot_id(lot_id)
-            if lot_data:
-                await notify_previous_leader(
-                    context.bot,
-                    previous_leader_id,
-                    lot_data,
-                    bet_value,
-                    lot_id
+        lot = await fetch_lot_data_by_lot_id(lot_id)
+        if not lot:
+            await update.message.reply_text(UNAVAILABLE_TEXT)
+            return
+        result = await order_book.place(
+            lot_id,
+            user_baserow_id,
+            bet_value,
+            lot.initial_price,
+            persist=lambda: bid_journal.append(lot_id, user_baserow_id, user_id, bet_value)
+        )
+        if not result.accepted:
+            clear_bet_context(context)
+            if result.reason == 'too_low':
+                await update.message.reply_text(
+                    f"📉 Ставка должна быть выше {result.previous_max} ₽{STALE_NOTE if baserow_degraded() else ''}"
                 )
-        admin_chat_id = os.getenv('ADMIN_TELEGRAM_ID')
-        if admin_chat_id:
-            # Получаем данные пользователя
-            user_baserow_id = get_user_baserow_id(user_id)
-            user_data = requests.get(
-                f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_USERS_ID')}/{user_baserow_id}/?user_field_names=true",
-                headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"}
-            ).json()
-
-            # Получаем данные лота
-            lot_data = fetch_lot_data_by_lot_id(lot_id)
-            
-            # Формируем сообщение
-            message = (
-                "🎉 Новая ставка!\n\n"
-                f"Лот: {lot_data.get('Name', 'Нет данных')}\n"
-                f"Номер лота: {lot_data.get('LotNumber', 'Нет данных')}\n"
-                f"Ставка: {bet_value:.0f} ₽\n"
-                f"TG ID: {user_id}\n"
-                f"Username: @{user_data.get('Username', 'нет')}\n"
-                f"Телефон: {user_data.get('PhoneNumber', 'не указан')}"
-            )
+            elif result.reason == 'own_bet':
+                await update.message.reply_text("❌ Нельзя повышать свою ставку")
+            elif result.reason == 'closed':
+                await update.message.reply_text("⛔ Торги по этому лоту завершены")
+            else:
+                await update.message.reply_text("❌ Ошибка сохранения ставки")
+            return
 
-            # Отправляем администратору
-            await context.bot.send_message(
-                chat_id=admin_chat_id,
-                text=message,
-                parse_mode=ParseMode.HTML
-            )
-        else:
-            logger.warning("Не указан ADMIN_TELEGRAM_ID в .env")
+        # Уведомления отправляются в фоне и не задерживают ответ участнику
+        previous_leader_id = result.previous_leader_id
+        if previous_leader_id and previous_leader_id != user_baserow_id:
+            context.application.create_task(notify_previous_leader(
+                previous_leader_id,
+                lot,
+                bet_value,
+                lot_id
+            ))
+        context.application.create_task(
+            notify_admin(update.effective_user, user_baserow_id, lot_id, lot, bet_value)
+        )
+
+        extended = ""
+        if new_end := auction_close.soft_close(lot_id):
+            extended = f"\n\n⏱ Ставка сделана в последние минуты — торги по лоту продлены до {new_end:%H:%M}."
 
         web_app_button = InlineKeyboardButton(
             "🖼 Вернуться в приложение",
@@ -462,31 +715,29 @@ async def process_bet(context, update, lot_id, user_id):
         # Отправляем сообщение с кнопкой
         await update.message.reply_text(
             f"✅ Ставка {bet_value} ₽ принята!\n\n"
-            f"Мы сообщим, если вашу ставку перебьют или вы выиграете аукцион. Итоги аукциона будут объявлены 8 февраля 2025 года.",
+            f"Мы сообщим, если вашу ставку перебьют или вы выиграете аукцион. {auction_close.results_text(lot_id)}"
+            f"{extended}{QUEUED_NOTE if baserow_degraded() else ''}",
             reply_markup=InlineKeyboardMarkup([[web_app_button]])
         )
         
  
         # Очистка контекста
-        context.user_data.pop('previous_leader_id', None)
-        context.user_data.pop('previous_max', None)
-        context.user_data.pop('bet_value', None)
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления админу: {str(e)}")
+        clear_bet_context(context)
     except Exception as e:
         logger.error(f"Ошибка в process_bet: {str(e)}\n{traceback.format_exc()}")
         await update.message.reply_text("❌ Произошла ошибка")
 
-async def send_event_info(update):
-    await update.message.reply_text(
-        "Приглашаем Вас на торжественную церемонию закрытия выставки Евгения Нована «Вечное возвращение»\n\n"
+EVENT_INFO_TEXT = (
+    "Приглашаем Вас на торжественную церемонию закрытия выставки Евгения Нована «Вечное возвращение»\n\n"
 
-        "Вечером у вас будет возможность окончательно убедиться в серьезности вашего намерения приобрести это произведение искусства и лично пообщаться с автором\n\n"
+    "Вечером у вас будет возможность окончательно убедиться в серьезности вашего намерения приобрести это произведение искусства и лично пообщаться с автором\n\n"
 
-        "🏛 Галерея «Арка»\n"
-        "7 февраля с 17:00 до 20:00"
-    
-    )
+    "🏛 Галерея «Арка»\n"
+    "7 февраля с 17:00 до 20:00"
+)
+
+async def send_event_info(update):
+    await update.message.reply_text(EVENT_INFO_TEXT)
     
 # Функция для отпарвки сообщения от авторизованного по  (от имени бота)
 async def notify_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -520,60 +771,408 @@ async def notify_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка в /notify: {str(e)}")
         await update.message.reply_text("❌ Произошла ошибка при обработке команды")    
 
-def add_bet_to_baserow(lot_id: str, user_id: int, bet_value: float) -> bool:
+async def add_bet_to_baserow(lot_id: str, user_baserow_id: int, bet_value: float, date: str) -> bool:
     try:
-        user_baserow_id = get_user_baserow_id(user_id)
-        if not user_baserow_id:
-            return False
-
         data = {
             "BetValue": bet_value,
-            "Date": datetime.now().isoformat(),
+            "Date": date,
             "User": [user_baserow_id],
             "Lot": int(lot_id)
         }
         
-        response = requests.post(
-            f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_BETS_ID')}/?user_field_names=true",
-            headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"},
-            json=data
-        )
+        # Окончательный отказ Baserow пробрасывается: журнал уберёт ставку из очереди
+        row = await get_client().create_row(os.getenv('BASEROW_BETS_ID'), data, strict=True)
         
-        return response.status_code == 200
+        return row is not None
         
+    except BaserowRejected:
+        raise
     except Exception as e:
         logger.error(f"Ошибка сохранения ставки: {str(e)}")
         return False
 
-def update_user_phone_number(telegram_id: int, phone: str) -> bool:
+def on_bet_rejected(entry, reason: str):
+    # Отклонённая ставка могла стать максимумом в книге: лот перечитывается из Bets и журнала
+    order_book.invalidate(entry.lot_id)
+    if entry.telegram_id:
+        lot = lot_cache.get_stale(entry.lot_id)
+        notification_queue.enqueue(
+            entry.telegram_id,
+            f"⚠️ Ваша ставка {entry.value:.0f} ₽ на лот «{lot.name if lot else entry.lot_id}» не была записана. "
+            "Пожалуйста, сделайте ставку ещё раз."
+        )
+    if admin_chat_id := os.getenv('ADMIN_TELEGRAM_ID'):
+        notification_queue.enqueue(
+            admin_chat_id,
+            f"⚠️ Ставка {entry.value:.0f} ₽ на лот {entry.lot_id} (пользователь {entry.user_id}) "
+            f"не записана в Baserow и перенесена в {bid_journal.dead_letter_path}: {reason}"
+        )
+
+async def update_user_phone_number(telegram_id: int, phone: str) -> bool:
     try:
-        user_id = get_user_baserow_id(telegram_id)
+        user_id = await get_user_baserow_id(telegram_id)
         if not user_id:
             return False
             
-        response = requests.patch(
-            f"{os.getenv('BASEROW_BASE_URL')}/database/rows/table/{os.getenv('BASEROW_USERS_ID')}/{user_id}/?user_field_names=true",
-            headers={"Authorization": f"Token {os.getenv('BASEROW_TOKEN')}"},
-            json={"PhoneNumber": phone}
+        updated = await get_client().update_row(
+            os.getenv('BASEROW_USERS_ID'), user_id, {"PhoneNumber": phone}, model=User
         )
+        user_resolver.remember(updated)
         
-        return response.status_code == 200
+        return updated is not None
         
     except Exception as e:
         logger.error(f"Ошибка обновления телефона: {str(e)}")
         return False
 
-def run_telegram_bot():
-    logger.info("🚀 Запуск бота...")
-    application = ApplicationBuilder().token(os.getenv('TELEGRAM_BOT_TOKEN')).build()
-    
+def collect_snapshot() -> dict:
+    return {
+        'bets_cursor': bet_feed.cursor,
+        'bets_count': bet_feed.count,
+        'hydrated': order_book.hydrated,
+        'maxima': order_book.export(),
+        'users': user_resolver.export(),
+        # Модели сохраняются кортежами значений в порядке __slots__
+        'lots': {lot_id: lot.to_tuple() for lot_id, lot in lot_cache.export().items()},
+        'artists': artist_cache.export(),
+        'photo_ids': lot_photo_ids,
+        'auctions': auction_close.export(),
+    }
+
+async def restore_snapshot(snapshot: dict) -> tuple:
+    for values in snapshot.get('users', []):
+        user_resolver.remember(User.from_tuple(values))
+    lot_cache.restore({lot_id: Lot.from_tuple(values) for lot_id, values in snapshot.get('lots', {}).items()})
+    artist_cache.restore(snapshot.get('artists', {}))
+    lot_photo_ids.update({lot_id: tuple(photo) for lot_id, photo in snapshot.get('photo_ids', {}).items()})
+    order_book.restore(snapshot.get('maxima', {}), snapshot.get('hydrated', False))
+    await auction_close.restore(snapshot.get('auctions', {}))
+    logger.info(
+        f"Состояние восстановлено из снимка: пользователей {len(snapshot.get('users', []))}, "
+        f"лотов со ставками {len(snapshot.get('maxima', {}))}"
+    )
+    return snapshot.get('bets_cursor', 0), snapshot.get('bets_count', 0)
+
+async def load_auction_schedule(job_queue):
+    try:
+        await auction_close.load()
+        if job_queue is not None:
+            auction_close.schedule(job_queue)
+        else:
+            logger.error("JobQueue недоступна: установите python-telegram-bot[job-queue]")
+    except Exception as e:
+        logger.error(f"Ошибка загрузки расписания аукционов: {str(e)}")
+
+async def reconcile_snapshot(job_queue):
+    # Бот уже отвечает по снимку; здесь он догоняет изменения метаданных в Baserow
+    await load_auction_schedule(job_queue)
+    try:
+        async for lot in get_client().iter_rows(os.getenv('BASEROW_LOTS_ID'), model=Lot):
+            if lot_cache.get_stale(str(lot.id)) is not None:
+                lot_cache.set(str(lot.id), lot)
+        async for artist in get_client().iter_rows(os.getenv('BASEROW_ARTISTS_ID'), model=Artist):
+            if artist_cache.get_stale(artist.id) is not None:
+                artist_cache.set(artist.id, artist.display_name)
+        async for user in get_client().iter_rows(os.getenv('BASEROW_USERS_ID'), model=User):
+            user_resolver.refresh(user)
+        logger.info("Снимок сверен с Baserow")
+    except Exception as e:
+        logger.error(f"Ошибка сверки снимка с Baserow: {str(e)}")
+
+async def on_startup(application):
+    notification_queue.start(application.bot)
+    get_client().breaker.on_change = on_baserow_state_change
+    bid_journal.open()
+    cursor, count = 0, 0
+    snapshot = snapshot_store.load() if snapshot_store else None
+    try:
+        if snapshot:
+            cursor, count = await restore_snapshot(snapshot)
+        else:
+            cursor, count = await order_book.hydrate()
+        for entry in bid_journal.pending():
+            await order_book.observe(entry.lot_id, entry.user_id, entry.value)
+    except Exception as e:
+        # Лоты будут подгружаться по одному при первом обращении
+        logger.error(f"Ошибка загрузки книги ставок: {str(e)}")
+    bid_journal.start()
+    bet_feed.seek(cursor, count)
+
+    if snapshot:
+        try:
+            # Ставки, сделанные на сайте, пока бот был остановлен: читается только хвост Bets
+            await bet_feed.poll()
+        except Exception as e:
+            logger.error(f"Ошибка чтения ставок после перезапуска: {str(e)}")
+        if application.job_queue is not None:
+            auction_close.schedule(application.job_queue)
+        # post_init выполняется до запуска Application, поэтому задача создаётся напрямую
+        application.bot_data['reconcile_task'] = asyncio.create_task(reconcile_snapshot(application.job_queue))
+    else:
+        await load_auction_schedule(application.job_queue)
+    if snapshot_store:
+        snapshot_store.start(collect_snapshot)
+
+    serve_http = False
+    if metrics_path := os.getenv('METRICS_PATH', '/metrics'):
+        http_server.route('GET', metrics_path, registry.handle_http)
+        serve_http = True
+
+    feed_mode = os.getenv('BET_FEED_MODE', 'poll')
+    if feed_mode == 'webhook':
+        if not bet_feed.secret:
+            logger.error("Для BET_FEED_MODE=webhook нужен BASEROW_WEBHOOK_SECRET")
+        http_server.route('POST', os.getenv('BET_FEED_PATH', '/baserow/bets'), bet_feed.handle_webhook)
+        serve_http = True
+    elif feed_mode == 'poll':
+        bet_feed.start(bet_feed.cursor, bet_feed.count)
+
+    if serve_http:
+        try:
+            await http_server.start()
+        except OSError as e:
+            # Занятый порт (второй экземпляр, конфликт на хосте) не должен мешать приёму ставок
+            logger.error(f"HTTP-сервер не запущен на {http_server.host}:{http_server.port}: {str(e)}")
+            if feed_mode == 'webhook':
+                # Вебхук Baserow недоступен — новые ставки с сайта читаются опросом
+                bet_feed.start(bet_feed.cursor, bet_feed.count)
+
+async def on_stop(application):
+    # Рассылки прерываются до остановки бота, позиция сохраняется для продолжения
+    await broadcast_runner.shutdown()
+
+async def on_shutdown(application):
+    if (reconcile_task := application.bot_data.pop('reconcile_task', None)) is not None:
+        reconcile_task.cancel()
+        await asyncio.gather(reconcile_task, return_exceptions=True)
+    await bet_feed.stop()
+    if snapshot_store:
+        await snapshot_store.stop()
+    await http_server.stop()
+    await admin_digest.stop()
+    await bid_journal.stop()
+    await notification_queue.stop()
+    await close_client()
+
+# Сброс кеша лотов и художников: /cache_clear [lot|artist] [id]
+async def clear_cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if str(update.effective_user.id) != os.getenv('ADMIN_TELEGRAM_ID'):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+
+        caches = {'lot': lot_cache, 'artist': artist_cache}
+        target, *rest = context.args or ['all']
+        if target != 'all' and target not in caches:
+            await update.message.reply_text("❌ Формат команды: /cache_clear [lot|artist] [id]")
+            return
+
+        key = rest[0] if rest else None
+        selected = caches.values() if target == 'all' else [caches[target]]
+        removed = sum(cache.invalidate(key) for cache in selected)
+        # В карточках лотов есть имена художников, поэтому они сбрасываются вместе с кешем
+        lot_cards.invalidate(key if target == 'lot' else None)
+
+        stats = "\n".join(
+            f"{name}: {c.stats()['size']} записей, попаданий {c.hits}, промахов {c.misses}"
+            for name, c in caches.items()
+        )
+        await update.message.reply_text(f"✅ Удалено записей: {removed}\n\n{stats}")
+
+    except Exception as e:
+        logger.error(f"Ошибка в /cache_clear: {str(e)}")
+        await update.message.reply_text("❌ Произошла ошибка при обработке команды")
+
+# Режим уведомлений администратора: /digest <секунды>, 0 — по каждой ставке
+async def set_admin_digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if str(update.effective_user.id) != os.getenv('ADMIN_TELEGRAM_ID'):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+
+        if context.args:
+            admin_digest.set_window(max(float(context.args[0]), 0))
+
+        if admin_digest.window > 0:
+            await update.message.reply_text(f"✅ Сводка ставок раз в {admin_digest.window:g} с")
+        else:
+            await update.message.reply_text("✅ Уведомление о каждой ставке")
+
+    except ValueError:
+        await update.message.reply_text("❌ Формат команды: /digest <секунды>")
+    except Exception as e:
+        logger.error(f"Ошибка в /digest: {str(e)}")
+        await update.message.reply_text("❌ Произошла ошибка при обработке команды")
+
+# Досрочное закрытие торгов: /close <lot_id> [lot_id ...]
+async def close_lots_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if str(update.effective_user.id) != os.getenv('ADMIN_TELEGRAM_ID'):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+
+        if not context.args:
+            await update.message.reply_text("❌ Формат команды: /close <lot_id> [lot_id ...]")
+            return
+
+        if invalid := [lot_id for lot_id in context.args if not lot_id.isdigit()]:
+            await update.message.reply_text(f"❌ Некорректные номера лотов: {', '.join(invalid)}")
+            return
+        lots = await asyncio.gather(*(fetch_lot_data_by_lot_id(lot_id) for lot_id in context.args))
+        if missing := [lot_id for lot_id, lot in zip(context.args, lots) if lot is None]:
+            await update.message.reply_text(
+                UNAVAILABLE_TEXT if baserow_degraded() else f"❌ Лоты не найдены: {', '.join(missing)}"
+            )
+            return
+
+        winners = await auction_close.close_lots(context.args)
+        await update.message.reply_text(f"✅ Торги закрыты, продано лотов: {len(winners)}")
+
+    except Exception as e:
+        logger.error(f"Ошибка в /close: {str(e)}\n{traceback.format_exc()}")
+        await update.message.reply_text("❌ Произошла ошибка при обработке команды")
+
+async def report_broadcast(bot, broadcast: Broadcast):
+    try:
+        await bot.edit_message_text(
+            broadcast.progress(),
+            chat_id=broadcast.chat_id,
+            message_id=broadcast.message_id
+        )
+    except Exception as e:
+        logger.debug(f"Не удалось обновить статус рассылки: {str(e)}")
+
+# Массовая рассылка: /broadcast <all|lot <lot_id>|leaders> <текст|event>
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if str(update.effective_user.id) != os.getenv('ADMIN_TELEGRAM_ID'):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+
+        # Текст берём из сообщения целиком, чтобы сохранить переносы строк
+        parts = update.message.text.split(maxsplit=2)
+        lot_id = None
+        if len(parts) == 3 and parts[1] == 'lot':
+            lot_id, _, text = parts[2].partition(' ')
+        else:
+            text = parts[2] if len(parts) == 3 else ''
+        if len(parts) < 3 or parts[1] not in AUDIENCES or not text.strip() or (lot_id is not None and not lot_id.isdigit()):
+            await update.message.reply_text(
+                "❌ Формат команды: /broadcast <all|lot <lot_id>|leaders> <сообщение|event>"
+            )
+            return
+
+        if text.strip() == 'event':
+            text = EVENT_INFO_TEXT
+        status_message = await update.message.reply_text("📣 Рассылка запускается…")
+        broadcast = Broadcast(
+            None, parts[1], lot_id, text,
+            chat_id=status_message.chat_id,
+            message_id=status_message.message_id
+        )
+        await broadcast_runner.store.save(broadcast)
+        broadcast_runner.start(broadcast, report=lambda b: report_broadcast(context.bot, b))
+
+    except Exception as e:
+        logger.error(f"Ошибка в /broadcast: {str(e)}\n{traceback.format_exc()}")
+        await update.message.reply_text("❌ Произошла ошибка при обработке команды")
+
+# Управление рассылкой: /broadcast_stop <id>, /broadcast_resume <id>
+async def broadcast_control(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if str(update.effective_user.id) != os.getenv('ADMIN_TELEGRAM_ID'):
+            await update.message.reply_text("❌ Доступ запрещен")
+            return
+
+        command = update.message.text.split()[0].lstrip('/').split('@')[0]
+        if len(context.args) != 1:
+            await update.message.reply_text(f"❌ Формат команды: /{command} <id>")
+            return
+        broadcast_id = int(context.args[0])
+
+        if command == 'broadcast_stop':
+            if broadcast_runner.stop(broadcast_id):
+                await update.message.reply_text(f"⏸ Рассылка #{broadcast_id} остановлена")
+            else:
+                await update.message.reply_text(f"❌ Рассылка #{broadcast_id} не выполняется")
+            return
+
+        broadcast = broadcast_runner.store.load(broadcast_id)
+        if broadcast is None or broadcast.status == 'done' or broadcast_runner.is_running(broadcast_id):
+            await update.message.reply_text(f"❌ Рассылку #{broadcast_id} нельзя продолжить")
+            return
+        status_message = await update.message.reply_text(broadcast.progress())
+        broadcast.chat_id, broadcast.message_id = status_message.chat_id, status_message.message_id
+        broadcast_runner.start(broadcast, report=lambda b: report_broadcast(context.bot, b))
+
+    except ValueError:
+        await update.message.reply_text("❌ Неверный ID рассылки")
+    except Exception as e:
+        logger.error(f"Ошибка управления рассылкой: {str(e)}")
+        await update.message.reply_text("❌ Произошла ошибка при обработке команды")
+
+def add_handlers(application):
+    # Общий набор обработчиков для запуска бота и нагрузочного теста
     application.add_handler(CommandHandler("notify", notify_user))
+    application.add_handler(CommandHandler("cache_clear", clear_cache))
+    application.add_handler(CommandHandler("digest", set_admin_digest))
+    application.add_handler(CommandHandler("close", close_lots_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler(["broadcast_stop", "broadcast_resume"], broadcast_control))
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CallbackQueryHandler(handle_button_click, pattern="^raise_bet_"))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Regex(r'^79\d{9}$'), handle_phone_input))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_bet_value))
-    
-    application.run_polling()
+
+def make_update_processor(concurrent_updates: int, ordering: str = 'chat'):
+    # ordering='chat' — апдейты одного чата по очереди, 'none' — без ограничений
+    if concurrent_updates > 1 and ordering == 'chat':
+        return ChatOrderedUpdateProcessor(concurrent_updates)
+    return concurrent_updates
+
+def run_telegram_bot(concurrent_updates: int = None, ordering: str = None):
+    logger.info("🚀 Запуск бота...")
+    mode = os.getenv('BOT_MODE', 'polling')
+    if mode == 'webhook' and not (os.getenv('WEBHOOK_URL') and os.getenv('WEBHOOK_SECRET')):
+        logger.error("Для режима webhook нужны WEBHOOK_URL и WEBHOOK_SECRET")
+        return
+
+    builder = (
+        ApplicationBuilder()
+        .token(os.getenv('TELEGRAM_BOT_TOKEN'))
+        # Асинхронный клиент Baserow помогает, только если апдейты обрабатываются
+        # параллельно: при concurrent_updates=1 медленный ответ задерживает всех
+        .concurrent_updates(make_update_processor(
+            concurrent_updates or int(os.getenv('BOT_CONCURRENT_UPDATES', '32')),
+            ordering or os.getenv('BOT_UPDATE_ORDERING', 'chat')
+        ))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+    )
+    # Сессии ставок переживают перезапуск; пустой BOT_STATE_PATH отключает хранение
+    state_path = os.getenv('BOT_STATE_PATH', 'bot_state.sqlite3')
+    if state_path:
+        builder = builder.persistence(SQLitePersistence(
+            state_path,
+            update_interval=float(os.getenv('BOT_STATE_FLUSH_INTERVAL', '5'))
+        ))
+    application = builder.build()
+    add_handlers(application)
+
+    if mode == 'webhook':
+        # Telegram сам присылает обновления; запросы без секретного заголовка отклоняются
+        url_path = os.getenv('WEBHOOK_PATH', 'telegram').strip('/')
+        application.run_webhook(
+            listen=os.getenv('WEBHOOK_LISTEN', '127.0.0.1'),
+            port=int(os.getenv('WEBHOOK_PORT', '8443')),
+            url_path=url_path,
+            webhook_url=f"{os.getenv('WEBHOOK_URL').rstrip('/')}/{url_path}",
+            secret_token=os.getenv('WEBHOOK_SECRET'),
+            max_connections=int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+        )
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     run_telegram_bot()
\ No newline at end of file
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+
+from baserow_client import BaserowError, get_client
+from models import Bet, User
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200
+AUDIENCES = ('all', 'lot', 'leaders')
+
+
+class Broadcast:
+    __slots__ = ('broadcast_id', 'audience', 'lot_id', 'text', 'page', 'offset',
+                 'sent', 'failed', 'status', 'chat_id', 'message_id')
+
+    def __init__(self, broadcast_id, audience, lot_id, text, page=1, offset=0,
+                 sent=0, failed=0, status='running', chat_id=None, message_id=None):
+        self.broadcast_id = broadcast_id
+        self.audience = audience
+        self.lot_id = lot_id
+        self.text = text
+        self.page = page
+        self.offset = offset
+        self.sent = sent
+        self.failed = failed
+        self.status = status
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    def progress(self) -> str:
+        return (
+            f"📣 Рассылка #{self.broadcast_id} ({self.audience}): {self.status}\n"
+            f"Отправлено: {self.sent}, ошибок: {self.failed}\n"
+            f"Позиция: страница {self.page}, запись {self.offset}"
+        )
+
+
+class BroadcastStore:
+    """Состояние рассылок в SQLite, чтобы прерванную рассылку можно было продолжить."""
+
+    _COLUMNS = ('broadcast_id', 'audience', 'lot_id', 'text', 'page', 'offset',
+                'sent', 'failed', 'status', 'chat_id', 'message_id')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Файл открывается при первой рассылке, а не при импорте модуля
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS broadcasts ("
+                "broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT, audience TEXT, lot_id TEXT, text TEXT, "
+                "page INTEGER, offset INTEGER, sent INTEGER, failed INTEGER, status TEXT, "
+                "chat_id INTEGER, message_id INTEGER)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _save(self, values: tuple):
+        with self._db() as conn:
+            cursor = conn.execute(
+                f"INSERT OR REPLACE INTO broadcasts ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                values
+            )
+            return cursor.lastrowid
+
+    async def save(self, broadcast: Broadcast):
+        values = tuple(getattr(broadcast, column) for column in self._COLUMNS)
+        async with self._lock:
+            broadcast.broadcast_id = await asyncio.to_thread(self._save, values)
+
+    def load(self, broadcast_id: int) -> Broadcast:
+        row = self._db().execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM broadcasts WHERE broadcast_id = ?",
+            (broadcast_id,)
+        ).fetchone()
+        return Broadcast(*row) if row else None
+
+
+class BroadcastRunner:
+    """Массовая рассылка по сегментам аудитории.
+
+    Получатели читаются из Baserow постранично и не загружаются целиком;
+    отправка идёт в общих лимитах очереди уведомлений. После каждой
+    отправки курсор (страница, позиция) сохраняется, поэтому рассылку
+    можно остановить и продолжить с того же места. При остановке бота
+    рассылки прерываются (shutdown), а не задерживают её до конца.
+    """
+
+    def __init__(self, store: BroadcastStore, send, order_book, user_resolver, progress_interval: float = 5.0):
+        # send(chat_id, text) -> bool, отправляет сообщение с ожиданием результата
+        self.store = store
+        self._send = send
+        self._order_book = order_book
+        self._user_resolver = user_resolver
+        self.progress_interval = progress_interval
+        self._running = {}
+        self._tasks = {}
+
+    def start(self, broadcast: Broadcast, report):
+        # Задача не регистрируется в Application: Application.stop() ждал бы конца рассылки
+        task = asyncio.create_task(self.run(broadcast, report))
+        self._tasks[broadcast.broadcast_id] = task
+        task.add_done_callback(
+            lambda t, broadcast_id=broadcast.broadcast_id:
+                self._tasks.pop(broadcast_id) if self._tasks.get(broadcast_id) is t else None
+        )
+        return task
+
+    async def shutdown(self, timeout: float = 5.0):
+        # Курсор сохраняется после каждой отправки, рассылку продолжит /broadcast_resume
+        for broadcast in self._running.values():
+            broadcast.status = 'stopped'
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"Остановлено рассылок: {len(tasks)}")
+
+    def is_running(self, broadcast_id: int) -> bool:
+        return broadcast_id in self._running
+
+    def stop(self, broadcast_id: int) -> bool:
+        broadcast = self._running.get(broadcast_id)
+        if broadcast is None:
+            return False
+        broadcast.status = 'stopped'
+        return True
+
+    async def _telegram_ids(self, user_ids) -> list:
+        users = await asyncio.gather(*(self._user_resolver.get_row_by_id(u) for u in user_ids))
+        # Позиции сохраняются и для ненайденных пользователей, чтобы курсор не сдвигался
+        return [user.telegram_id if user else None for user in users]
+
+    async def _pages(self, broadcast: Broadcast):
+        # (номер страницы, chat_id получателей) начиная со страницы курсора
+        if broadcast.audience == 'all':
+            page = broadcast.page
+            while True:
+                data = await get_client().list_rows(
+                    os.getenv('BASEROW_USERS_ID'), model=User, page=page, size=PAGE_SIZE
+                )
+                if data is None:
+                    raise BaserowError(f"Не удалось получить страницу {page} пользователей")
+                yield page, [user.telegram_id for user in data.get('results', [])]
+                if not data.get('next'):
+                    return
+                page += 1
+
+        if broadcast.audience == 'lot':
+            user_ids = []
+            async for bet in get_client().iter_rows(
+                os.getenv('BASEROW_BETS_ID'),
+                model=Bet,
+                filter__Lot__link_row_has=int(broadcast.lot_id)
+            ):
+                if bet.user_id is not None and bet.user_id not in user_ids:
+                    user_ids.append(bet.user_id)
+        else:
+            user_ids = sorted(set(self._order_book.leaders().values()))
+
+        # Порядок списка стабилен, поэтому курсор работает так же, как для страниц Baserow
+        for start in range((broadcast.page - 1) * PAGE_SIZE, len(user_ids), PAGE_SIZE):
+            yield start // PAGE_SIZE + 1, await self._telegram_ids(user_ids[start:start + PAGE_SIZE])
+
+    async def run(self, broadcast: Broadcast, report):
+        # report(broadcast) обновляет сообщение о ходе рассылки у администратора
+        self._running[broadcast.broadcast_id] = broadcast
+        broadcast.status = 'running'
+        last_report = time.monotonic()
+        try:
+            async for page, chat_ids in self._pages(broadcast):
+                start = broadcast.offset if page == broadcast.page else 0
+                for offset in range(start, len(chat_ids)):
+                    if broadcast.status != 'running':
+                        return
+                    if chat_ids[offset] and await self._send(chat_ids[offset], broadcast.text):
+                        broadcast.sent += 1
+                    else:
+                        broadcast.failed += 1
+                    broadcast.page, broadcast.offset = page, offset + 1
+                    await self.store.save(broadcast)
+                    if time.monotonic() - last_report >= self.progress_interval:
+                        last_report = time.monotonic()
+                        await report(broadcast)
+                broadcast.page, broadcast.offset = page + 1, 0
+            broadcast.status = 'done'
+        except Exception as e:
+            logger.error(f"Ошибка рассылки #{broadcast.broadcast_id}: {str(e)}")
+            broadcast.status = 'failed'
+        finally:
+            self._running.pop(broadcast.broadcast_id, None)
+            await self.store.save(broadcast)
+            await report(broadcast)
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Ограниченный по размеру кеш с временем жизни записей и вытеснением LRU."""
+
+    def __init__(self, maxsize: int = 512, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        key = str(key)
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            # Просроченная запись остаётся до вытеснения для get_stale()
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get_stale(self, key):
+        # Значение без учёта срока жизни — на случай недоступности источника
+        entry = self._data.get(str(key))
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value):
+        key = str(key)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def export(self) -> dict:
+        return {key: value for key, (_, value) in self._data.items()}
+
+    def restore(self, items: dict):
+        for key, value in items.items():
+            self.set(key, value)
+
+    def invalidate(self, key=None) -> int:
+        if key is None:
+            count = len(self._data)
+            self._data.clear()
+            return count
+        return 1 if self._data.pop(str(key), None) is not None else 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpServer:
+    """Минимальный HTTP-сервер на asyncio для служебных эндпоинтов бота.
+
+    Обработчик маршрута получает заголовки (ключи в нижнем регистре) и тело
+    запроса и возвращает (статус, content-type, тело ответа в байтах).
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._routes = {}
+        self._server = None
+
+    def route(self, method: str, path: str, handler):
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"HTTP-сервер запущен на {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            status, content_type, body = await self._dispatch(reader)
+        except Exception as e:
+            logger.error(f"Ошибка обработки HTTP-запроса: {str(e)}")
+            status, content_type, body = 500, 'text/plain', b''
+        try:
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            return 400, 'text/plain', b''
+        method, target = request_line[0].upper(), request_line[1]
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_SIZE:
+            return 413, 'text/plain', b''
+        body = await reader.readexactly(length) if length else b''
+
+        handler = self._routes.get((method, target.split('?', 1)[0]))
+        if handler is None:
+            return 404, 'text/plain', b''
+        return await handler(headers, body)
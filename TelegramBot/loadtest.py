@@ -0,0 +1,455 @@
+"""Нагрузочный тест потока ставок.
+
+Настоящие обработчики bot.py работают против заглушек Baserow (httpx.MockTransport)
+и Telegram Bot API внутри одного процесса. Участники одновременно делают ставки,
+после чего выводятся задержка ответа (p50/p90/p99), число запросов к Baserow
+на ставку и проверка, что лидер и максимальная ставка каждого лота совпадают
+с записанным в таблицу Bets.
+
+    python loadtest.py --bidders 300 --bids 5 --hot-lots 3 --baserow-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter, defaultdict
+from urllib.parse import parse_qsl
+
+import httpx
+from telegram.request import BaseRequest
+
+ROWS_URL = re.compile(r'/database/rows/table/(\d+)/(?:(\d+)/)?$')
+TABLES = {'lots': 101, 'artists': 102, 'bets': 103, 'users': 104, 'auctions': 105}
+LINK_FIELDS = {'Lot', 'User', 'Artists', 'Auction'}
+TELEGRAM_ID_BASE = 10_000_000
+ADMIN_CHAT_ID = 1
+# Ответы участнику на ставку; уведомления о перебитой ставке начинаются с ♦️
+REPLY_OUTCOMES = (
+    ('✅', 'accepted'), ('📉', 'too_low'), ('❌ Нельзя', 'own_bet'),
+    ('⛔', 'closed'), ('⏳', 'rate_limited'), ('📱', 'phone_required'),
+)
+
+
+class FakeBaserow:
+    """Таблицы Baserow в памяти с эндпоинтами /database/rows/table/{id}/."""
+
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = defaultdict(dict)
+        self.requests = Counter()
+        self._next_id = defaultdict(int)
+
+    def add(self, table: str, row: dict) -> dict:
+        table_id = TABLES[table]
+        self._next_id[table_id] += 1
+        row['id'] = self._next_id[table_id]
+        self.tables[table_id][row['id']] = row
+        return row
+
+    def rows(self, table: str) -> list:
+        return list(self.tables[TABLES[table]].values())
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        match = ROWS_URL.search(request.url.path)
+        if match is None:
+            return httpx.Response(404)
+        table_id, row_id = int(match.group(1)), match.group(2)
+        table = self.tables[table_id]
+        name = next((n for n, t in TABLES.items() if t == table_id), str(table_id))
+        self.requests[(request.method, name)] += 1
+
+        if row_id is not None:
+            row = table.get(int(row_id))
+            if row is None:
+                return httpx.Response(404)
+            if request.method == 'PATCH':
+                row.update(self._links(json.loads(request.content)))
+            return httpx.Response(200, json=row)
+
+        if request.method == 'POST':
+            self._next_id[table_id] += 1
+            row = {**self._links(json.loads(request.content)), 'id': self._next_id[table_id]}
+            if 'BetValue' in row:
+                # BetValue — текстовое поле
+                row['BetValue'] = str(row['BetValue'])
+            table[row['id']] = row
+            return httpx.Response(200, json=row)
+
+        params = dict(parse_qsl(request.url.query.decode()))
+        rows = [row for row in table.values() if self._matches(row, params)]
+        page, size = int(params.get('page', 1)), int(params.get('size', 100))
+        results = rows[(page - 1) * size:page * size]
+        return httpx.Response(200, json={
+            'count': len(rows),
+            'next': str(request.url.copy_set_param('page', page + 1)) if page * size < len(rows) else None,
+            'previous': None,
+            'results': results,
+        })
+
+    @staticmethod
+    def _links(data: dict) -> dict:
+        # Связи принимаются списком id или одним id, а отдаются списком объектов
+        for field in LINK_FIELDS & data.keys():
+            ids = data[field] if isinstance(data[field], list) else [data[field]]
+            data[field] = [{'id': i} for i in ids]
+        return data
+
+    @staticmethod
+    def _matches(row: dict, params: dict) -> bool:
+        for key, value in params.items():
+            if not key.startswith('filter__'):
+                continue
+            _, field, operator = key.split('__', 2)
+            if operator == 'link_row_has':
+                if int(value) not in [link.get('id') for link in row.get(field) or []]:
+                    return False
+            elif operator == 'equal':
+                if str(row.get(field, '')) != value:
+                    return False
+        return True
+
+
+class FakeTelegram(BaseRequest):
+    """Bot API: подтверждает отправку и передаёт ответы бота ожидающим участникам."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+        self.waiters = {}
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, chat_id, **fields) -> dict:
+        self._message_id += 1
+        return {
+            'message_id': self._message_id, 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'}, **fields,
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        params = request_data.parameters if request_data else {}
+
+        if api_method == 'getMe':
+            result = {'id': 42, 'is_bot': True, 'first_name': 'Aspy', 'username': 'aspy_loadtest_bot'}
+        elif api_method in ('sendMessage', 'sendPhoto'):
+            chat_id = int(params['chat_id'])
+            text = params.get('text') or params.get('caption') or ''
+            waiter = self.waiters.get(chat_id)
+            if waiter is not None and not waiter.done() and not text.startswith('♦️'):
+                waiter.set_result(text)
+            fields = {'text': text}
+            if api_method == 'sendPhoto':
+                fields = {'caption': text, 'photo': [{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 1, 'height': 1}]}
+            result = self._message(chat_id, **fields)
+        elif api_method == 'getUserProfilePhotos':
+            result = {'total_count': 0, 'photos': []}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def populate(baserow: FakeBaserow, args):
+    auction = baserow.add('auctions', {'Name': 'Аукцион', 'end_date': '2099-12-31'})
+    for n in range(args.artists):
+        baserow.add('artists', {'Name': f'Художник {n}', 'displayName': f'Художник {n}'})
+    for n in range(args.lots):
+        baserow.add('lots', {
+            'Name': f'Лот {n + 1}', 'LotNumber': str(n + 1), 'InitialPrice': str(args.initial_price),
+            'Artists': [{'id': n % args.artists + 1}], 'Image': [], 'Auction': [{'id': auction['id']}],
+            'status': True, 'FinalPrice': '',
+        })
+    for n in range(args.users):
+        row_id = n + 1
+        baserow.add('users', {
+            'TelegramID': str(TELEGRAM_ID_BASE + row_id), 'Username': f'user{row_id}',
+            'PhoneNumber': f'79{row_id:09d}', 'ProfileImage': '',
+        })
+    # История ставок по всем лотам, чтобы загрузка книги ставок читала несколько страниц
+    prices = defaultdict(lambda: args.initial_price)
+    for _ in range(args.history):
+        lot_id = random.randint(1, args.lots)
+        prices[lot_id] += args.step
+        baserow.add('bets', {
+            'BetValue': str(prices[lot_id]), 'Date': '2025-01-01T00:00:00',
+            'User': [{'id': random.randint(1, args.users)}], 'Lot': [{'id': lot_id}],
+        })
+    return dict(prices)
+
+
+class Storm:
+    def __init__(self, application, telegram: FakeTelegram, args, prices: dict):
+        self.application = application
+        self.telegram = telegram
+        self.args = args
+        self.prices = prices
+        self.latencies = []
+        self.outcomes = Counter()
+        self.accepted = defaultdict(list)
+        self._update_id = 0
+
+    def _user(self, telegram_id: int) -> dict:
+        return {'id': telegram_id, 'is_bot': False, 'first_name': 'Участник', 'username': f'user{telegram_id}'}
+
+    async def _send(self, telegram_id: int, payload: dict) -> tuple:
+        from telegram import Update
+        self._update_id += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self.telegram.waiters[telegram_id] = waiter
+        update = Update.de_json({'update_id': self._update_id, **payload}, self.application.bot)
+        started = time.perf_counter()
+        await self.application.update_queue.put(update)
+        text = await asyncio.wait_for(waiter, self.args.reply_timeout)
+        return time.perf_counter() - started, text
+
+    async def open_lot(self, telegram_id: int, lot_id: int):
+        await self._send(telegram_id, {'callback_query': {
+            'id': str(telegram_id), 'from': self._user(telegram_id), 'chat_instance': 'loadtest',
+            'data': f'raise_bet_{lot_id}',
+            'message': {'message_id': 1, 'date': int(time.time()), 'text': 'lot',
+                        'chat': {'id': telegram_id, 'type': 'private'}},
+        }})
+
+    async def bid(self, telegram_id: int, lot_id: int, value: float):
+        self._update_id += 1
+        try:
+            latency, text = await self._send(telegram_id, {'message': {
+                'message_id': self._update_id, 'date': int(time.time()), 'text': f'{value:.0f}',
+                'chat': {'id': telegram_id, 'type': 'private'}, 'from': self._user(telegram_id),
+            }})
+        except asyncio.TimeoutError:
+            self.outcomes['timeout'] += 1
+            return
+        outcome = next((o for prefix, o in REPLY_OUTCOMES if text.startswith(prefix)), 'error')
+        self.latencies.append(latency)
+        self.outcomes[outcome] += 1
+        if outcome == 'accepted':
+            self.accepted[lot_id].append(value)
+            self.prices[lot_id] = max(self.prices.get(lot_id, 0), value)
+
+    def _lot(self, n: int) -> int:
+        return n % self.args.hot_lots + 1
+
+    async def open_sessions(self):
+        # Сессии открываются до замера; в отчёт попадают только ставки
+        await asyncio.gather(*(
+            self.open_lot(TELEGRAM_ID_BASE + n + 1, self._lot(n)) for n in range(self.args.bidders)
+        ))
+
+    async def bidder(self, n: int):
+        telegram_id, lot_id = TELEGRAM_ID_BASE + n + 1, self._lot(n)
+        for _ in range(self.args.bids):
+            await asyncio.sleep(random.uniform(0, self.args.think_time))
+            # Участник видит последнюю принятую цену; одновременные ставки сталкиваются
+            current = self.prices.get(lot_id, self.args.initial_price)
+            await self.bid(telegram_id, lot_id, current + self.args.step * random.randint(1, 3))
+
+    async def run(self):
+        await asyncio.gather(*(self.bidder(n) for n in range(self.args.bidders)))
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def check_leaders(bot, baserow: FakeBaserow, storm: Storm, history_max_id: int, args) -> list:
+    # Ставки в Bets по каждому лоту должны строго расти, а максимум и лидер
+    # совпадать с книгой ставок и последней подтверждённой участнику ставкой
+    problems = []
+    bets = defaultdict(list)
+    for row in sorted(baserow.rows('bets'), key=lambda r: r['id']):
+        bets[row['Lot'][0]['id']].append((float(row['BetValue']), row['User'][0]['id'], row['id']))
+    for lot_id in range(1, args.hot_lots + 1):
+        new = [bet for bet in bets[lot_id] if bet[2] > history_max_id]
+        if len(new) != len(storm.accepted[lot_id]):
+            problems.append(f"лот {lot_id}: подтверждено {len(storm.accepted[lot_id])}, записано {len(new)}")
+        values = [value for value, _, _ in bets[lot_id]]
+        if any(b <= a for a, b in zip(values, values[1:])):
+            problems.append(f"лот {lot_id}: ставки в Bets не возрастают")
+        if not bets[lot_id]:
+            continue
+        top_value, top_user, _ = max(bets[lot_id])
+        book_max, book_leader = await bot.order_book.get(str(lot_id), args.initial_price)
+        if (book_max, book_leader) != (top_value, top_user):
+            problems.append(f"лот {lot_id}: книга ставок {book_max}/{book_leader}, Bets {top_value}/{top_user}")
+        if storm.accepted[lot_id] and max(storm.accepted[lot_id]) != top_value:
+            problems.append(f"лот {lot_id}: последняя подтверждённая ставка {max(storm.accepted[lot_id])}, в Bets {top_value}")
+    return problems
+
+
+def configure_env(args, workdir: str):
+    os.environ.update({
+        'BASEROW_BASE_URL': 'http://baserow.loadtest/api', 'BASEROW_TOKEN': 'loadtest',
+        'BASEROW_LOTS_ID': str(TABLES['lots']), 'BASEROW_ARTISTS_ID': str(TABLES['artists']),
+        'BASEROW_BETS_ID': str(TABLES['bets']), 'BASEROW_USERS_ID': str(TABLES['users']),
+        'BASEROW_AUCTIONS_ID': str(TABLES['auctions']),
+        'ADMIN_TELEGRAM_ID': str(ADMIN_CHAT_ID),
+        'BID_JOURNAL_PATH': os.path.join(workdir, 'bids.journal'),
+        'BROADCAST_STATE_PATH': os.path.join(workdir, 'state.sqlite3'),
+        'SNAPSHOT_PATH': os.path.join(workdir, 'snapshot.json'),
+        'BET_FEED_MODE': args.feed_mode, 'METRICS_PATH': '',
+    })
+    if not args.rate_limit:
+        os.environ.update({'BID_RATE_PER_USER': '0', 'BID_RATE_PER_LOT': '0'})
+
+
+async def main(args):
+    # Журнал, SQLite и снимок живут только на время прогона
+    with tempfile.TemporaryDirectory(prefix='aspy-loadtest-') as workdir:
+        return await run(args, workdir)
+
+
+async def run(args, workdir: str):
+    random.seed(args.seed)
+    configure_env(args, workdir)
+
+    # bot читает настройки из окружения при импорте
+    import baserow_client
+    import bot
+    from telegram.ext import ApplicationBuilder
+    logging.getLogger().setLevel(args.log_level)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    baserow = FakeBaserow(args.baserow_latency, args.jitter)
+    prices = populate(baserow, args)
+    history_max_id = len(baserow.rows('bets'))
+    baserow_client._client = baserow_client.BaserowClient(
+        os.environ['BASEROW_BASE_URL'], 'loadtest',
+        max_concurrency=args.baserow_concurrency, transport=baserow.transport()
+    )
+    telegram = FakeTelegram(args.telegram_latency)
+    application = (
+        ApplicationBuilder()
+        .token('123456:LOADTEST')
+        .request(telegram)
+        .get_updates_request(telegram)
+        .concurrent_updates(bot.make_update_processor(args.concurrent_updates, args.ordering))
+        .build()
+    )
+    bot.add_handlers(application)
+
+    started = time.perf_counter()
+    await application.initialize()
+    await bot.on_startup(application)
+    await application.start()
+    startup = time.perf_counter() - started
+    startup_requests = sum(baserow.requests.values())
+
+    storm = Storm(application, telegram, args, prices)
+    await storm.open_sessions()
+    baserow.requests.clear()
+    storm_started = time.perf_counter()
+    await storm.run()
+    duration = time.perf_counter() - storm_started
+
+    deadline = time.monotonic() + args.drain_timeout
+    while bot.bid_journal.pending() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    storm_requests = sum(baserow.requests.values())
+    problems = await check_leaders(bot, baserow, storm, history_max_id, args)
+
+    await application.stop()
+    await bot.on_shutdown(application)
+    await application.shutdown()
+
+    bids = sum(storm.outcomes.values())
+    report = {
+        'startup_seconds': round(startup, 3),
+        'startup_baserow_requests': startup_requests,
+        'bids': bids,
+        'duration_seconds': round(duration, 3),
+        'bids_per_second': round(bids / duration, 1) if duration else 0,
+        'latency_ms': {
+            'p50': round(percentile(storm.latencies, 0.50) * 1000, 1),
+            'p90': round(percentile(storm.latencies, 0.90) * 1000, 1),
+            'p99': round(percentile(storm.latencies, 0.99) * 1000, 1),
+            'max': round(max(storm.latencies, default=0) * 1000, 1),
+        },
+        'outcomes': dict(storm.outcomes),
+        'baserow_requests_per_bid': round(storm_requests / bids, 2) if bids else 0,
+        'baserow_requests': {f'{m} {t}': c for (m, t), c in sorted(baserow.requests.items())},
+        'telegram_calls': dict(telegram.calls),
+        'journal_pending': len(bot.bid_journal.pending()),
+        'leaders_ok': not problems,
+        'problems': problems,
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return 0 if not problems else 1
+
+
+def print_report(report: dict):
+    latency = report['latency_ms']
+    print(f"Запуск:             {report['startup_seconds']} с, запросов к Baserow: {report['startup_baserow_requests']}")
+    print(f"Ставок:             {report['bids']} за {report['duration_seconds']} с ({report['bids_per_second']}/с)")
+    print(f"Задержка ответа:    p50 {latency['p50']} мс, p90 {latency['p90']} мс, p99 {latency['p99']} мс, max {latency['max']} мс")
+    print(f"Исходы:             {report['outcomes']}")
+    print(f"Запросов к Baserow: {report['baserow_requests_per_bid']} на ставку")
+    for name, count in report['baserow_requests'].items():
+        print(f"    {name:<16} {count}")
+    print(f"Вызовы Telegram:    {report['telegram_calls']}")
+    print(f"Не синхронизировано ставок: {report['journal_pending']}")
+    print(f"Лидеры:             {'OK' if report['leaders_ok'] else 'ОШИБКА'}")
+    for problem in report['problems']:
+        print(f"    {problem}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--bidders', type=int, default=200, help='одновременных участников')
+    parser.add_argument('--bids', type=int, default=5, help='ставок на участника')
+    parser.add_argument('--hot-lots', type=int, default=3, help='лотов, на которые идут ставки')
+    parser.add_argument('--lots', type=int, default=50, help='лотов в таблице')
+    parser.add_argument('--users', type=int, default=5000, help='пользователей в таблице')
+    parser.add_argument('--artists', type=int, default=20, help='художников в таблице')
+    parser.add_argument('--history', type=int, default=2000, help='ставок в таблице до начала теста')
+    parser.add_argument('--initial-price', type=float, default=1000)
+    parser.add_argument('--step', type=float, default=100, help='шаг ставки')
+    parser.add_argument('--think-time', type=float, default=0.2, help='максимальная пауза между ставками, с')
+    parser.add_argument('--baserow-latency', type=float, default=0.05, help='задержка ответа Baserow, с')
+    parser.add_argument('--jitter', type=float, default=0.5, help='разброс задержки Baserow, доля')
+    parser.add_argument('--baserow-concurrency', type=int, default=int(os.getenv('BASEROW_MAX_CONCURRENCY', '10')))
+    parser.add_argument('--telegram-latency', type=float, default=0.02, help='задержка ответа Telegram, с')
+    parser.add_argument('--concurrent-updates', type=int, default=int(os.getenv('BOT_CONCURRENT_UPDATES', '32')))
+    parser.add_argument('--ordering', default=os.getenv('BOT_UPDATE_ORDERING', 'chat'), choices=('chat', 'none'))
+    parser.add_argument('--feed-mode', default='poll', choices=('poll', 'webhook', 'off'))
+    parser.add_argument('--rate-limit', action='store_true', help='не отключать ограничение частоты ставок')
+    parser.add_argument('--reply-timeout', type=float, default=60)
+    parser.add_argument('--drain-timeout', type=float, default=60, help='ожидание синхронизации журнала, с')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--json', action='store_true', help='вывести отчёт в JSON')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    raise SystemExit(asyncio.run(main(parse_args())))
@@ -0,0 +1,62 @@
+import asyncio
+from collections import OrderedDict
+from typing import NamedTuple
+
+from models import Lot
+
+
+class LotCard(NamedTuple):
+    # Текст карточки до и после строки с предложенной ставкой
+    header: str
+    footer: str
+    reply_markup: object
+    price: float
+    lot: Lot
+
+
+class LotCardCache:
+    """Готовые карточки лотов для ответа на /start bid_….
+
+    Карточка пересобирается, только когда меняется лот (новый объект
+    из кеша лотов) или текущая цена, поэтому повторные переходы по одной
+    ссылке обходятся без форматирования и запросов к Baserow. Одновременные
+    промахи по одному лоту собирают карточку один раз.
+    """
+
+    def __init__(self, render, maxsize: int = 512):
+        # render(lot_id, lot, price) -> LotCard
+        self._render = render
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cards = OrderedDict()
+        self._pending = {}
+
+    async def get(self, lot_id, lot: Lot, price: float) -> LotCard:
+        lot_id = str(lot_id)
+        card = self._cards.get(lot_id)
+        if card is not None and card.price == price and card.lot is lot:
+            self._cards.move_to_end(lot_id)
+            self.hits += 1
+            return card
+        self.misses += 1
+        key = (lot_id, price, id(lot))
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._render(lot_id, lot, price))
+        try:
+            card = await asyncio.shield(self._pending[key])
+        finally:
+            if self._pending.get(key) is not None and self._pending[key].done():
+                self._pending.pop(key, None)
+        self._cards[lot_id] = card
+        self._cards.move_to_end(lot_id)
+        while len(self._cards) > self.maxsize:
+            self._cards.popitem(last=False)
+        return card
+
+    def invalidate(self, lot_id=None) -> int:
+        if lot_id is None:
+            count = len(self._cards)
+            self._cards.clear()
+            return count
+        return 1 if self._cards.pop(str(lot_id), None) is not None else 0
@@ -0,0 +1,128 @@
+import functools
+import re
+import time
+from bisect import bisect_left
+
+# Границы корзин в секундах: от быстрых ответов из памяти до таймаутов Baserow
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_ROW_ID = re.compile(r'(/table/\d+/)\d+/$')
+
+
+def endpoint(url: str) -> str:
+    # Номер строки в метку не попадает, иначе число рядов метрики не ограничено
+    return _ROW_ID.sub(r'\1:id/', url)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return '{' + pairs + '}'
+
+
+class MetricsRegistry:
+    """Гистограммы задержек, счётчики и измеряемые при выдаче значения.
+
+    render() отдаёт текстовый формат Prometheus для эндпоинта /metrics.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, callback, **labels):
+        # callback() вызывается при каждом запросе /metrics
+        self._gauges[_key(name, labels)] = callback
+
+    def timed(self, name: str, **labels):
+        """Декоратор асинхронной функции: длительность вызова с меткой status=ok|error."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                status = 'error'
+                try:
+                    result = await func(*args, **kwargs)
+                    status = 'ok'
+                    return result
+                finally:
+                    self.observe(name, time.perf_counter() - started, status=status, **labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> str:
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            header(name, 'histogram')
+            labels = dict(labels)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        for (name, labels), value in sorted(self._counters.items()):
+            header(name, 'counter')
+            lines.append(f"{name}{_labels(dict(labels))} {value:g}")
+
+        for (name, labels), callback in sorted(self._gauges.items(), key=lambda item: item[0]):
+            header(name, 'gauge')
+            try:
+                value = float(callback())
+            except Exception:
+                continue
+            lines.append(f"{name}{_labels(dict(labels))} {value:g}")
+
+        return '\n'.join(lines) + '\n'
+
+    async def handle_http(self, headers: dict, body: bytes):
+        return 200, 'text/plain; version=0.0.4', self.render().encode()
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,111 @@
+"""Компактные модели строк Baserow.
+
+Строка разбирается один раз на границе клиента (параметр model у методов
+BaserowClient): из JSON остаются только поля, которые использует бот, а
+вложенные списки связей превращаются в id. Пустые и некорректные значения
+дают None, а не исключение в обработчике.
+"""
+
+
+def _link_id(value):
+    # Поле связи Baserow: [{'id': ..., 'value': ...}, ...]
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return value[0].get('id')
+    return None
+
+
+def _float(value, default=None):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def _text(value) -> str:
+    return '' if value is None else str(value)
+
+
+class Row:
+    __slots__ = ()
+
+    def to_tuple(self) -> tuple:
+        # Для снимка состояния: значения в порядке __slots__
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values):
+        row = cls.__new__(cls)
+        for field, value in zip(cls.__slots__, values):
+            setattr(row, field, value)
+        return row
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Lot(Row):
+    __slots__ = ('id', 'name', 'number', 'initial_price', 'artist_ids',
+                 'image_url', 'image_name', 'auction_id', 'active')
+
+    @classmethod
+    def from_row(cls, row: dict):
+        lot = cls.__new__(cls)
+        lot.id = row.get('id')
+        lot.name = _text(row.get('Name'))
+        lot.number = _text(row.get('LotNumber'))
+        lot.initial_price = _float(row.get('InitialPrice'), 0.0)
+        lot.artist_ids = tuple(a['id'] for a in row.get('Artists') or [] if isinstance(a, dict) and a.get('id'))
+        image = (row.get('Image') or [{}])[0]
+        lot.image_url = image.get('url')
+        # Ссылки на файлы могут быть подписанными; имя файла постоянно
+        lot.image_name = image.get('name') or lot.image_url
+        lot.auction_id = _link_id(row.get('Auction'))
+        # status = false — торги по лоту завершены
+        lot.active = row.get('status') is not False
+        return lot
+
+
+class Bet(Row):
+    __slots__ = ('id', 'lot_id', 'user_id', 'value', 'placed_at')
+
+    @classmethod
+    def from_row(cls, row: dict):
+        bet = cls.__new__(cls)
+        bet.id = row.get('id')
+        lot_id = _link_id(row.get('Lot'))
+        bet.lot_id = str(lot_id) if lot_id is not None else None
+        bet.user_id = _link_id(row.get('User'))
+        # BetValue — текстовое поле
+        bet.value = _float(row.get('BetValue'))
+        # Date в формате ISO; разбирается там, где нужен часовой пояс аукциона
+        bet.placed_at = row.get('Date') or None
+        return bet
+
+    @property
+    def valid(self) -> bool:
+        return self.lot_id is not None and self.value is not None
+
+
+class User(Row):
+    __slots__ = ('id', 'telegram_id', 'username', 'phone')
+
+    @classmethod
+    def from_row(cls, row: dict):
+        user = cls.__new__(cls)
+        user.id = row.get('id')
+        user.telegram_id = row.get('TelegramID') if row.get('TelegramID') not in (None, '') else None
+        user.username = row.get('Username') or None
+        user.phone = row.get('PhoneNumber') or None
+        return user
+
+
+class Artist(Row):
+    __slots__ = ('id', 'display_name')
+
+    @classmethod
+    def from_row(cls, row: dict):
+        artist = cls.__new__(cls)
+        artist.id = row.get('id')
+        artist.display_name = row.get('displayName') or 'Нет данных'
+        return artist
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import Forbidden, BadRequest, NetworkError, RetryAfter, TelegramError
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class Notification:
+    __slots__ = ('chat_id', 'kwargs', 'coalesce_key', 'attempts')
+
+    def __init__(self, chat_id, kwargs: dict, coalesce_key=None):
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.coalesce_key = coalesce_key
+        self.attempts = 0
+
+
+def _seconds(delay) -> float:
+    # В новых версиях python-telegram-bot retry_after может быть timedelta
+    return delay.total_seconds() if hasattr(delay, 'total_seconds') else float(delay)
+
+
+class NotificationQueue:
+    """Фоновая отправка сообщений с учётом лимитов Telegram.
+
+    Обработчики только ставят сообщение в очередь и не ждут доставки.
+    У каждого чата своя очередь, а воркеры берут сообщение только того
+    чата, которому уже можно писать: очередь к медленному чату (например,
+    к администратору) не занимает воркеры и не задерживает остальных.
+    Воркеры соблюдают общий лимит, повторяют отправку после 429 и
+    объединяют повторные сообщения с одним ключом, пока те ещё не
+    отправлены.
+    """
+
+    def __init__(self, workers: int = 4, global_rate: float = 25.0,
+                 per_chat_interval: float = 1.0, max_retries: int = 5):
+        self.workers = workers
+        self.global_interval = 1.0 / global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._bot = None
+        # chat_id, которым можно отправить следующее сообщение
+        self._ready = asyncio.Queue()
+        # chat_id → очередь сообщений; чат есть здесь, пока у него есть неотправленные
+        self._chats = {}
+        self._size = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._pending = {}
+        self._tasks = []
+        self._rate_lock = asyncio.Lock()
+        self._next_global = 0.0
+        self._next_chat = {}
+
+    def start(self, bot):
+        self._bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не отправлено уведомлений при остановке: {self._size}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def qsize(self) -> int:
+        return self._size
+
+    def enqueue(self, chat_id, text: str, coalesce_key=None, **kwargs):
+        kwargs['text'] = text
+        if coalesce_key is not None and coalesce_key in self._pending:
+            # Сообщение ещё в очереди — заменяем его текст на актуальный
+            self._pending[coalesce_key].kwargs = kwargs
+            return
+        notification = Notification(chat_id, kwargs, coalesce_key)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = notification
+        self._size += 1
+        self._idle.clear()
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            self._chats[chat_id] = deque([notification])
+            self._schedule(chat_id)
+        else:
+            queue.append(notification)
+
+    def _schedule(self, chat_id):
+        # Чат попадает к воркерам, когда истёк его интервал между сообщениями
+        loop = asyncio.get_running_loop()
+        delay = self._next_chat.get(chat_id, 0.0) - loop.time()
+        if delay > 0:
+            loop.call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    async def send_now(self, chat_id, text: str, **kwargs) -> bool:
+        # Отправка с ожиданием результата, в общих лимитах с очередью
+        kwargs['text'] = text
+        try:
+            return await self._deliver(Notification(chat_id, kwargs))
+        except Exception as e:
+            logger.error(f"Ошибка отправки сообщения {chat_id}: {str(e)}")
+            return False
+
+    async def _throttle(self, chat_id):
+        loop = asyncio.get_running_loop()
+        async with self._rate_lock:
+            now = loop.time()
+            send_at = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+            self._next_global = send_at + self.global_interval
+            self._next_chat[chat_id] = send_at + self.per_chat_interval
+            if len(self._next_chat) > 10000:
+                self._next_chat = {c: t for c, t in self._next_chat.items() if t > now}
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._chats[chat_id]
+            notification = queue.popleft()
+            try:
+                if self._pending.get(notification.coalesce_key) is notification:
+                    del self._pending[notification.coalesce_key]
+                await self._deliver(notification)
+            except Exception as e:
+                logger.error(f"Ошибка отправки уведомления {notification.chat_id}: {str(e)}")
+            finally:
+                self._size -= 1
+                if queue:
+                    self._schedule(chat_id)
+                else:
+                    del self._chats[chat_id]
+                if not self._size:
+                    self._idle.set()
+
+    async def _send(self, notification: Notification):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            await self._bot.send_message(chat_id=notification.chat_id, **notification.kwargs)
+            status = 'ok'
+        except TelegramError as e:
+            status = type(e).__name__
+            raise
+        finally:
+            registry.observe('telegram_send_duration_seconds', time.perf_counter() - started, status=status)
+
+    async def _deliver(self, notification: Notification) -> bool:
+        while True:
+            await self._throttle(notification.chat_id)
+            notification.attempts += 1
+            try:
+                await self._send(notification)
+                return True
+            except RetryAfter as e:
+                delay = _seconds(e.retry_after)
+                logger.warning(f"Лимит Telegram, повтор через {delay} с")
+                # Превышение лимита затрагивает всю отправку, а не один чат
+                async with self._rate_lock:
+                    self._next_global = max(self._next_global, asyncio.get_running_loop().time() + delay)
+            except (Forbidden, BadRequest) as e:
+                logger.warning(f"Сообщение {notification.chat_id} не доставлено: {str(e)}")
+                return False
+            except NetworkError:
+                if notification.attempts >= self.max_retries:
+                    raise
+                await asyncio.sleep(min(2 ** notification.attempts, 30))
+                continue
+            if notification.attempts >= self.max_retries:
+                logger.error(f"Уведомление {notification.chat_id} отброшено после {notification.attempts} попыток")
+                return False
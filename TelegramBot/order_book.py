@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import NamedTuple
+
+from baserow_client import get_client
+from models import Bet
+
+logger = logging.getLogger(__name__)
+
+
+class BidResult(NamedTuple):
+    accepted: bool
+    reason: str
+    previous_max: float
+    previous_leader_id: int
+
+
+class LotState:
+    __slots__ = ('max_bet', 'leader_id')
+
+    def __init__(self, max_bet=None, leader_id=None):
+        self.max_bet = max_bet
+        self.leader_id = leader_id
+
+
+class OrderBook:
+    """Актуальная максимальная ставка и лидер по каждому лоту.
+
+    Принятие ставки выполняется под блокировкой лота: сравнение с текущим
+    максимумом, запись в Baserow и смена лидера происходят атомарно.
+    """
+
+    def __init__(self, loader):
+        # loader(lot_id) -> (max_bet | None, leader_id | None), читает Baserow
+        self._loader = loader
+        self._lots = {}
+        self._locks = defaultdict(asyncio.Lock)
+        self._frozen = set()
+        # Лоты, которые нужно перечитать загрузчиком даже после hydrate()
+        self._stale = set()
+        self.hydrated = False
+
+    async def hydrate(self) -> tuple:
+        # Один проход по таблице Bets вместо запроса на каждый лот;
+        # возвращает (максимальный id ставки, число строк) для чтения новых ставок
+        lots = {}
+        max_id, rows = 0, 0
+        async for bet in get_client().iter_rows(os.getenv('BASEROW_BETS_ID'), model=Bet):
+            rows += 1
+            max_id = max(max_id, bet.id or 0)
+            if not bet.valid:
+                continue
+            state = lots.setdefault(bet.lot_id, LotState())
+            if state.max_bet is None or bet.value > state.max_bet:
+                state.max_bet, state.leader_id = bet.value, bet.user_id
+        self._lots.update(lots)
+        self.hydrated = True
+        logger.info(f"Книга ставок загружена: {len(lots)} лотов")
+        return max_id, rows
+
+    def export(self) -> dict:
+        return {
+            lot_id: [state.max_bet, state.leader_id]
+            for lot_id, state in self._lots.items() if state.max_bet is not None
+        }
+
+    def restore(self, maxima: dict, hydrated: bool):
+        # Максимумы из снимка; новые ставки досчитываются через observe()
+        for lot_id, (max_bet, leader_id) in maxima.items():
+            self._lots[str(lot_id)] = LotState(max_bet, leader_id)
+        self.hydrated = hydrated
+
+    async def _state(self, lot_id: str) -> LotState:
+        state = self._lots.get(lot_id)
+        if state is None:
+            if self.hydrated and lot_id not in self._stale:
+                # После загрузки отсутствие лота означает, что ставок ещё нет
+                state = LotState()
+            else:
+                state = LotState(*await self._loader(lot_id))
+                self._stale.discard(lot_id)
+            self._lots[lot_id] = state
+        return state
+
+    async def get(self, lot_id, initial_price: float) -> tuple:
+        lot_id = str(lot_id)
+        async with self._locks[lot_id]:
+            state = await self._state(lot_id)
+        if state.max_bet is None:
+            return (float(initial_price), None)
+        return (state.max_bet, state.leader_id)
+
+    def invalidate(self, lot_id):
+        # Максимум лота больше не подтверждён (ставку отклонил Baserow):
+        # при следующем обращении он перечитывается загрузчиком
+        lot_id = str(lot_id)
+        self._lots.pop(lot_id, None)
+        self._stale.add(lot_id)
+
+    def leaders(self) -> dict:
+        return {lot_id: state.leader_id for lot_id, state in self._lots.items() if state.leader_id is not None}
+
+    async def freeze(self, lot_id):
+        # Под блокировкой: уже начатая ставка успеет завершиться, новые — нет
+        lot_id = str(lot_id)
+        async with self._locks[lot_id]:
+            self._frozen.add(lot_id)
+
+    def unfreeze(self, lot_id):
+        self._frozen.discard(str(lot_id))
+
+    def is_frozen(self, lot_id) -> bool:
+        return str(lot_id) in self._frozen
+
+    async def observe(self, lot_id, user_id: int, value: float) -> BidResult:
+        """Учитывает ставку, сохранённую в обход place(); accepted — ставка стала лидирующей."""
+        lot_id = str(lot_id)
+        async with self._locks[lot_id]:
+            if lot_id in self._frozen:
+                return BidResult(False, 'closed', None, None)
+            state = await self._state(lot_id)
+            if state.max_bet is not None and value <= state.max_bet:
+                return BidResult(False, 'too_low', state.max_bet, state.leader_id)
+            previous = BidResult(True, '', state.max_bet, state.leader_id)
+            state.max_bet, state.leader_id = value, user_id
+            return previous
+
+    async def place(self, lot_id, user_id: int, value: float, initial_price: float, persist) -> BidResult:
+        lot_id = str(lot_id)
+        async with self._locks[lot_id]:
+            if lot_id in self._frozen:
+                return BidResult(False, 'closed', float(initial_price), None)
+            state = await self._state(lot_id)
+            current = state.max_bet if state.max_bet is not None else float(initial_price)
+            if value <= current:
+                return BidResult(False, 'too_low', current, state.leader_id)
+            if state.leader_id == user_id:
+                return BidResult(False, 'own_bet', current, state.leader_id)
+            if not await persist():
+                return BidResult(False, 'not_saved', current, state.leader_id)
+            previous_leader_id = state.leader_id
+            state.max_bet, state.leader_id = value, user_id
+            return BidResult(True, '', current, previous_leader_id)
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+_DELETED = object()
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранение context.user_data в файле SQLite.
+
+    python-telegram-bot вызывает update_user_data пачкой раз в update_interval
+    секунд только для изменившихся пользователей. Здесь из этих данных
+    выбираются изменённые ключи, и вся пачка записывается одной транзакцией
+    в отдельном потоке, не задерживая обработку обновлений.
+
+    Хранилище рассчитано на один процесс бота: данные читаются один раз
+    при запуске, refresh_user_data ничего не перечитывает, поэтому второй
+    процесс с тем же файлом не увидит чужих изменений и перезапишет их.
+    """
+
+    def __init__(self, path: str, update_interval: float = 5.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL нужен ради дешёвых коммитов, а не для совместной работы процессов
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_data ("
+            "user_id INTEGER NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (user_id, key))"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        self._write_lock = asyncio.Lock()
+        self._stored = {}
+        self._pending = {}
+        self._write_task = None
+
+    def _write(self, batch: dict):
+        upserts, deletes = [], []
+        for (user_id, key), value in batch.items():
+            if value is _DELETED:
+                deletes.append((user_id, key))
+                continue
+            try:
+                upserts.append((user_id, key, json.dumps(value)))
+            except TypeError as e:
+                logger.warning(f"Значение {key} пользователя {user_id} не сохранено: {str(e)}")
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO user_data (user_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value",
+                upserts
+            )
+            self._conn.executemany("DELETE FROM user_data WHERE user_id = ? AND key = ?", deletes)
+
+    async def _write_batch(self):
+        # Даём остальным update_user_data из той же пачки добавить свои изменения
+        await asyncio.sleep(0)
+        self._write_task = None
+        batch, self._pending = self._pending, {}
+        async with self._write_lock:
+            await asyncio.to_thread(self._write, batch)
+
+    async def _schedule_write(self):
+        if self._write_task is None:
+            self._write_task = asyncio.ensure_future(self._write_batch())
+        await asyncio.shield(self._write_task)
+
+    async def get_user_data(self) -> dict:
+        with self._db_lock:
+            rows = self._conn.execute("SELECT user_id, key, value FROM user_data").fetchall()
+        data = {}
+        for user_id, key, value in rows:
+            data.setdefault(user_id, {})[key] = json.loads(value)
+        self._stored = {user_id: dict(values) for user_id, values in data.items()}
+        logger.info(f"Восстановлены сессии {len(data)} пользователей")
+        return data
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        stored = self._stored.get(user_id, {})
+        changed = False
+        for key, value in data.items():
+            if key not in stored or stored[key] != value:
+                self._pending[(user_id, key)] = value
+                changed = True
+        for key in stored.keys() - data.keys():
+            self._pending[(user_id, key)] = _DELETED
+            changed = True
+        if not changed:
+            return
+        self._stored[user_id] = dict(data)
+        await self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        for key in self._stored.pop(user_id, {}):
+            self._pending[(user_id, key)] = _DELETED
+        await self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await self._write_task
+        if self._pending:
+            batch, self._pending = self._pending, {}
+            self._write(batch)
+        self._conn.close()
+
+    # Остальные данные бот не хранит
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+
+
+class SnapshotStore:
+    """Снимок прогретого состояния бота на диске.
+
+    При запуске бот восстанавливает из снимка пользователей, лоты,
+    художников, максимальные ставки и file_id фото и сразу начинает
+    отвечать, а сверка с Baserow идёт в фоне. Снимок пишется атомарно
+    (временный файл и os.replace) раз в interval секунд и при остановке.
+    """
+
+    def __init__(self, path: str, interval: float = 60.0, max_age: float = 6 * 3600):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self._collect = None
+        self._task = None
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Снимок {self.path} не прочитан: {str(e)}")
+            return None
+        if data.get('version') != SNAPSHOT_VERSION:
+            return None
+        age = time.time() - data.get('saved_at', 0)
+        if age > self.max_age:
+            logger.info(f"Снимок устарел ({age:.0f} с), состояние будет загружено из Baserow")
+            return None
+        return data
+
+    def _write(self, data: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    async def save(self):
+        # Состояние собирается в цикле событий, запись на диск — в отдельном потоке
+        data = {'version': SNAPSHOT_VERSION, 'saved_at': time.time(), **self._collect()}
+        await asyncio.to_thread(self._write, data)
+
+    def start(self, collect):
+        # collect() -> dict с состоянием для снимка
+        self._collect = collect
+        self._task = asyncio.create_task(self._save_loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await self.save()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения снимка: {str(e)}")
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения снимка: {str(e)}")
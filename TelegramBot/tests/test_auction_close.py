@@ -0,0 +1,107 @@
+import asyncio
+
+import auction_close
+from baserow_client import BaserowError, BaserowRejected
+from models import User
+from order_book import OrderBook
+
+
+class FakeClient:
+    def __init__(self):
+        self.scan_error = None
+        # lot_id → 'ok' | 'timeout' | 'rejected'
+        self.update_result = {}
+
+    async def iter_rows(self, table_id, model=None, **params):
+        if self.scan_error:
+            raise self.scan_error
+        yield model.from_row({'id': 1, 'Lot': [{'id': 1}], 'User': [{'id': 5}], 'BetValue': '100'})
+
+    async def update_row(self, table_id, row_id, data, model=None, strict=False):
+        result = self.update_result.get(row_id, 'ok')
+        if result == 'rejected':
+            raise BaserowRejected("Baserow отклонил PATCH: 404", 404)
+        return None if result == 'timeout' else {'id': row_id}
+
+
+class Resolver:
+    async def get_row_by_id(self, user_id):
+        return User.from_row({'id': user_id, 'TelegramID': '500'})
+
+
+class JobQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def run_once(self, callback, when, data, name):
+        self.jobs.append(data)
+
+
+def make_engine(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(auction_close, 'get_client', lambda: client)
+    monkeypatch.setenv('ADMIN_TELEGRAM_ID', '1')
+    book = OrderBook(loader=None)
+    book.hydrated = True
+    sent = []
+    engine = auction_close.AuctionCloseEngine(
+        book, Resolver(), send=lambda chat_id, text: sent.append((chat_id, text)), pending_bets=lambda: []
+    )
+    engine._job_queue = JobQueue()
+    return engine, client, book, sent
+
+
+def test_failed_scan_keeps_lot_open_for_retry(monkeypatch):
+    engine, client, book, sent = make_engine(monkeypatch)
+    client.scan_error = BaserowError("Не удалось получить страницу 1")
+
+    assert asyncio.run(engine.close_lots(['1'])) == {}
+    assert book.is_frozen('1') and '1' not in engine._closed
+    assert engine._job_queue.jobs == [['1']]
+
+    client.scan_error = None
+    assert asyncio.run(engine.close_lots(['1'])) == {'1': (5, 100.0)}
+    assert '1' in engine._closed
+    # Победитель получает одно сообщение
+    assert len([text for chat_id, text in sent if chat_id == '500']) == 1
+
+
+def test_timeout_on_update_is_retried(monkeypatch):
+    engine, client, book, sent = make_engine(monkeypatch)
+    client.update_result['1'] = 'timeout'
+
+    asyncio.run(engine.close_lots(['1']))
+    assert '1' not in engine._closed and book.is_frozen('1')
+    assert engine._job_queue.jobs == [['1']]
+    assert not [text for chat_id, text in sent if chat_id == '500']
+
+
+def test_rejected_update_is_reported_once_and_not_retried(monkeypatch):
+    engine, client, book, sent = make_engine(monkeypatch)
+    client.update_result['999'] = 'rejected'
+
+    assert asyncio.run(engine.close_lots(['999'])) == {}
+    assert engine._job_queue.jobs == []
+    assert not book.is_frozen('999') and not engine.is_closed('999')
+    assert len([text for chat_id, text in sent if chat_id == '1']) == 1
+
+
+def test_soft_close_is_measured_from_bet_time(monkeypatch):
+    from datetime import datetime, timedelta
+
+    engine, client, book, sent = make_engine(monkeypatch)
+    engine.soft_close_window, engine.soft_close_extension = 60, 300
+    end = datetime.now(engine.tz) + timedelta(seconds=30)
+    engine._end_times['1'] = end
+
+    # Ставка сделана за 10 минут до конца, но прочитана только сейчас
+    early = (end - timedelta(minutes=10)).isoformat()
+    assert engine.soft_close('1', early) is None
+    assert engine.end_time('1') == end
+
+    # Ставка в последние 20 секунд продлевает торги от времени ставки
+    late = end - timedelta(seconds=20)
+    assert engine.soft_close('1', late.isoformat()) == late + timedelta(seconds=300)
+
+    # Ставка без времени — от момента обработки
+    assert engine.soft_close('1') is None
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from baserow_client import BaserowRejected
+from bid_journal import BidJournal
+
+
+def write_journal(path, entries):
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry_id, lot_id, value in entries:
+            f.write(json.dumps({
+                'op': 'bid', 'id': entry_id, 'lot': lot_id, 'user': 7,
+                'tg': 700, 'value': value, 'at': '2026-01-01T12:00:00'
+            }) + "\n")
+
+
+def test_rejected_entry_is_dead_lettered_and_does_not_block_queue(tmp_path):
+    path = str(tmp_path / 'bids.journal')
+    # Первая ставка — на удалённый лот, Baserow отвечает 400
+    write_journal(path, [('bad', '404', 100.0), ('good-1', '1', 200.0), ('good-2', '2', 300.0)])
+    written, dead = [], []
+
+    async def writer(entry):
+        if entry.lot_id == '404':
+            raise BaserowRejected("Baserow отклонил POST: 400", 400)
+        written.append(entry.entry_id)
+        return True
+
+    async def exists(entry):
+        return False
+
+    async def run():
+        journal = BidJournal(
+            path, writer, exists, retry_base=0.01,
+            on_dead_letter=lambda entry, reason: dead.append((entry.entry_id, reason))
+        )
+        journal.open()
+        assert len(journal.pending()) == 3
+        journal.start()
+        await asyncio.wait_for(journal.stop(), 5)
+        return journal
+
+    journal = asyncio.run(run())
+
+    assert written == ['good-1', 'good-2']
+    assert [entry_id for entry_id, _ in dead] == ['bad']
+    with open(journal.dead_letter_path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [(r['id'], r['lot']) for r in records] == [('bad', '404')]
+    assert '400' in records[0]['error']
+
+    # После перезапуска в журнале не остаётся ни синхронизированных, ни отклонённых ставок
+    reopened = BidJournal(path, writer, exists)
+    reopened.open()
+    assert reopened.pending() == []
+    reopened._file.close()
+
+
+def test_temporary_failure_is_retried(tmp_path):
+    path = str(tmp_path / 'bids.journal')
+    write_journal(path, [('first', '1', 100.0)])
+    attempts = []
+
+    async def writer(entry):
+        attempts.append(entry.entry_id)
+        # Первая попытка — 5xx или таймаут: клиент возвращает None
+        return len(attempts) > 1
+
+    async def exists(entry):
+        return False
+
+    async def run():
+        journal = BidJournal(path, writer, exists, retry_base=0.01)
+        journal.open()
+        journal.start()
+        await asyncio.wait_for(journal.stop(), 5)
+        return journal
+
+    journal = asyncio.run(run())
+    assert attempts == ['first', 'first']
+    assert journal.pending() == []
+
+
+def test_dead_lettered_bid_is_dropped_from_order_book(tmp_path):
+    from order_book import OrderBook
+
+    path = str(tmp_path / 'bids.journal')
+    stored = {'1': (150.0, 3)}
+
+    async def loader(lot_id):
+        # Baserow знает только ставку 150 от пользователя 3
+        return stored.get(lot_id, (None, None))
+
+    async def writer(entry):
+        raise BaserowRejected("Baserow отклонил POST: 400", 400)
+
+    async def exists(entry):
+        return False
+
+    async def run():
+        book = OrderBook(loader)
+        book.hydrated = True
+        journal = BidJournal(
+            path, writer, exists,
+            on_dead_letter=lambda entry, reason: book.invalidate(entry.lot_id)
+        )
+        journal.open()
+        journal.start()
+        result = await book.place('1', 7, 500.0, 100.0, persist=lambda: journal.append('1', 7, 700, 500.0))
+        assert result.accepted
+        await asyncio.wait_for(journal.stop(), 5)
+        return await book.get('1', 100.0)
+
+    assert asyncio.run(run()) == (150.0, 3)
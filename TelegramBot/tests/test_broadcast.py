@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from broadcast import Broadcast, BroadcastRunner, BroadcastStore
+from models import User
+
+
+class Book:
+    def leaders(self):
+        return {str(lot_id): lot_id for lot_id in range(1, 101)}
+
+
+class Resolver:
+    async def get_row_by_id(self, user_id):
+        return User.from_row({'id': user_id, 'TelegramID': str(1000 + user_id)})
+
+
+def test_shutdown_stops_broadcast_and_keeps_cursor(tmp_path):
+    store = BroadcastStore(str(tmp_path / 'state.sqlite3'))
+
+    async def send(chat_id, text):
+        # 100 получателей по 50 мс — рассылка заняла бы 5 с
+        await asyncio.sleep(0.05)
+        return True
+
+    async def report(broadcast):
+        pass
+
+    async def run():
+        runner = BroadcastRunner(store, send, Book(), Resolver())
+        broadcast = Broadcast(None, 'leaders', None, 'текст')
+        await store.save(broadcast)
+        runner.start(broadcast, report)
+        await asyncio.sleep(0.3)
+        started = time.monotonic()
+        await runner.shutdown(timeout=2)
+        return broadcast.broadcast_id, time.monotonic() - started
+
+    broadcast_id, elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    saved = store.load(broadcast_id)
+    assert saved.status == 'stopped'
+    assert 0 < saved.sent < 100
+    assert (saved.page, saved.offset) == (1, saved.sent)
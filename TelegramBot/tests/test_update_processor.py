@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update
+
+from update_processor import ChatOrderedUpdateProcessor
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    return Update(update_id, message=Message(update_id, datetime.now(), chat, text=str(update_id)))
+
+
+async def feed(processor, updates, handle):
+    # Application создаёт задачу на каждый апдейт и передаёт его процессору
+    await asyncio.gather(*(
+        processor.process_update(update, handle(update)) for update in updates
+    ))
+
+
+def test_busy_chat_does_not_delay_other_chats():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(4)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        finished = {}
+
+        async def handle(update):
+            if update.effective_chat.id == 1:
+                await asyncio.sleep(0.1)
+            finished.setdefault(update.effective_chat.id, []).append(loop.time() - started)
+
+        # Чат 1 присылает 10 медленных апдейтов подряд, затем чат 2 — один быстрый
+        updates = [make_update(i, 1) for i in range(10)] + [make_update(100, 2)]
+        await feed(processor, updates, handle)
+        return finished
+
+    finished = asyncio.run(run())
+    assert finished[2][0] < 0.1
+    assert len(finished[1]) == 10
+
+
+def test_updates_of_one_chat_run_in_order():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(8)
+        order, running = [], set()
+
+        async def handle(update):
+            chat_id = update.effective_chat.id
+            assert chat_id not in running
+            running.add(chat_id)
+            await asyncio.sleep(0.01 * (update.update_id % 3))
+            order.append((chat_id, update.update_id))
+            running.discard(chat_id)
+
+        updates = [make_update(i, i % 3) for i in range(30)]
+        await feed(processor, updates, handle)
+        return order
+
+    order = asyncio.run(run())
+    for chat_id in range(3):
+        ids = [update_id for chat, update_id in order if chat == chat_id]
+        assert ids == sorted(ids) and len(ids) == 10
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+import user_resolver
+from baserow_client import BaserowError
+from models import User
+
+
+class FakeClient:
+    def __init__(self, response):
+        self.response = response
+
+    async def list_rows(self, table_id, model=None, **params):
+        return self.response
+
+
+def resolve(monkeypatch, response):
+    monkeypatch.setattr(user_resolver, 'get_client', lambda: FakeClient(response))
+    return asyncio.run(user_resolver.UserResolver().resolve(700))
+
+
+def test_unknown_user_resolves_to_none(monkeypatch):
+    assert resolve(monkeypatch, {'count': 0, 'results': []}) is None
+
+
+def test_known_user_resolves_to_row_id(monkeypatch):
+    user = User.from_row({'id': 7, 'TelegramID': '700'})
+    assert resolve(monkeypatch, {'count': 1, 'results': [user]}) == 7
+
+
+def test_baserow_failure_is_not_an_unknown_user(monkeypatch):
+    # list_rows возвращает None при таймауте, 5xx и разомкнутом предохранителе
+    with pytest.raises(BaserowError):
+        resolve(monkeypatch, None)
@@ -0,0 +1,64 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов с сохранением порядка внутри одного чата.
+
+    Апдейты разных чатов обрабатываются одновременно (не больше
+    max_concurrent_updates), а апдейты одного чата — строго по очереди:
+    ставка, за которой сразу следует номер телефона, не обгонит его.
+    Порядок ставок по одному лоту между чатами обеспечивают блокировки
+    лотов в книге ставок.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # chat_id → future завершения последнего апдейта этого чата
+        self._tails = {}
+
+    @staticmethod
+    def _chat_key(update):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+        return None
+
+    async def process_update(self, update, coroutine):
+        # Базовый класс держит слот семафора на всё время do_process_update.
+        # Здесь апдейт сначала ждёт предыдущие апдейты своего чата и только
+        # потом занимает слот: чат, засыпавший бота сообщениями, не отнимет
+        # слоты у остальных
+        key = self._chat_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        previous = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        try:
+            if previous is not None:
+                try:
+                    await asyncio.shield(previous)
+                except BaseException:
+                    coroutine.close()
+                    raise
+            await super().process_update(update, coroutine)
+        finally:
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
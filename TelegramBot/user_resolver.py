@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+
+from baserow_client import BaserowError, get_client
+from models import User
+
+logger = logging.getLogger(__name__)
+
+
+class UserResolver:
+    """Сопоставление TelegramID → пользователь (models.User) с прогреваемым кешем.
+
+    Первый промах выполняет отфильтрованный запрос к Baserow, дальше строка
+    отдаётся из памяти. Новые пользователи и изменения телефона попадают в
+    кеш через remember(), поэтому повторные запросы не нужны.
+    """
+
+    def __init__(self):
+        self._by_telegram_id = {}
+        self._by_row_id = {}
+        self._pending = {}
+
+    def remember(self, user: User):
+        if user is None or user.id is None:
+            return
+        self._by_row_id[user.id] = user
+        if user.telegram_id is not None:
+            self._by_telegram_id[str(user.telegram_id)] = user
+
+    def refresh(self, user: User):
+        # Обновляет только уже известных пользователей, не расширяя кеш
+        if user is not None and user.id in self._by_row_id:
+            self.remember(user)
+
+    def export(self) -> list:
+        return [user.to_tuple() for user in self._by_row_id.values()]
+
+    async def get_row(self, telegram_id):
+        key = str(telegram_id)
+        if key in self._by_telegram_id:
+            return self._by_telegram_id[key]
+        # Одновременные промахи по одному пользователю выполняют один запрос
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._fetch(key))
+        try:
+            return await asyncio.shield(self._pending[key])
+        finally:
+            if self._pending.get(key) is not None and self._pending[key].done():
+                self._pending.pop(key, None)
+
+    async def _fetch(self, key: str):
+        logger.debug(f"Поиск пользователя {key} в Baserow")
+        data = await get_client().list_rows(
+            os.getenv('BASEROW_USERS_ID'),
+            model=User,
+            filter__TelegramID__equal=key,
+            size=1
+        )
+        if data is None:
+            # Таймаут, 5xx или разомкнутый предохранитель — это не «пользователь не найден»
+            raise BaserowError(f"Не удалось найти пользователя {key} в Baserow")
+        results = data.get('results', [])
+        if not results:
+            return None
+        self.remember(results[0])
+        return results[0]
+
+    async def resolve(self, telegram_id):
+        user = await self.get_row(telegram_id)
+        return user.id if user else None
+
+    async def get_row_by_id(self, row_id):
+        if row_id is None:
+            return None
+        if row_id in self._by_row_id:
+            return self._by_row_id[row_id]
+        user = await get_client().get_row(os.getenv('BASEROW_USERS_ID'), row_id, model=User)
+        self.remember(user)
+        return user